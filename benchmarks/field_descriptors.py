@@ -0,0 +1,72 @@
+"""
+Per-access overhead of the field descriptors wrapping tracked fields,
+for the compiled descriptors and their pure-Python fallback.
+
+Usage: PYTHONPATH=src python benchmarks/field_descriptors.py
+"""
+
+import importlib.util
+import os
+import sys
+from timeit import repeat
+from unittest import mock
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("DJANGO_SETTINGS_MODULE", "tests.settings")
+
+import django  # noqa: E402
+
+django.setup()
+
+from django.db.models.query_utils import DeferredAttribute  # noqa: E402
+
+from dj_tracker import field_descriptors  # noqa: E402
+from dj_tracker.datastructures import FieldCounters  # noqa: E402
+from tests.models import Book  # noqa: E402
+
+NUMBER = 200_000
+
+
+def load_fallback():
+    spec = importlib.util.spec_from_file_location(
+        "field_descriptors_fallback", field_descriptors.__file__
+    )
+    module = importlib.util.module_from_spec(spec)
+    with mock.patch.dict(sys.modules, {"dj_tracker._field_descriptors": None}):
+        spec.loader.exec_module(module)
+    return module
+
+
+def make_instance(module):
+    class Row:
+        pass
+
+    descriptor = DeferredAttribute(Book._meta.get_field("title"))
+    if module:
+        descriptor = module.DeferredAttributeDescriptor(descriptor, "title")
+    Row.title = descriptor
+
+    instance = Row()
+    instance.__dict__["title"] = "title"
+    instance._tracker = FieldCounters(["title"]).new_instance_tracker()
+    return instance
+
+
+def report(name, instance):
+    namespace = {"instance": instance}
+    get = min(repeat("instance.title", number=NUMBER, globals=namespace)) / NUMBER
+    set = (
+        min(repeat("instance.title = 'title'", number=NUMBER, globals=namespace))
+        / NUMBER
+    )
+    print(f"{name:<12} get: {get * 1e9:6.0f}ns  set: {set * 1e9:6.0f}ns")
+
+
+def main():
+    report("untracked", make_instance(None))
+    report("python", make_instance(load_fallback()))
+    report("compiled", make_instance(field_descriptors))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,108 @@
+"""
+Per-row overhead of waiting for tracked instances to be garbage collected.
+
+Compares one `weakref.finalize` per model instance (the previous approach)
+with weak references swept by the queryset tracker, then times a tracked
+`.values()` queryset end to end.
+
+Usage: PYTHONPATH=src python benchmarks/instance_finalization.py [num_rows]
+"""
+
+import gc
+import os
+import sys
+import weakref
+from time import perf_counter
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("DJANGO_SETTINGS_MODULE", "tests.settings")
+
+import django  # noqa: E402
+
+django.setup()
+
+from django.test.utils import setup_databases, teardown_databases  # noqa: E402
+
+from dj_tracker import tracker  # noqa: E402
+from dj_tracker.datastructures import FieldCounters  # noqa: E402
+from tests.models import Category  # noqa: E402
+
+NUM_ROWS = int(sys.argv[1]) if len(sys.argv) > 1 else 50_000
+
+
+def measure(func):
+    gc.collect()
+    collections = sum(stat["collections"] for stat in gc.get_stats())
+    started_at = perf_counter()
+    func()
+    duration = perf_counter() - started_at
+    collections = sum(stat["collections"] for stat in gc.get_stats()) - collections
+    return duration, collections
+
+
+def report(name, duration, collections):
+    print(
+        f"{name:<24} {duration * 1e3:8.1f}ms {duration / NUM_ROWS * 1e9:8.0f}ns/row"
+        f" {collections:6} gc collections"
+    )
+
+
+def make_rows():
+    rows = []
+    field_counters = FieldCounters(("name",))
+    for i in range(NUM_ROWS):
+        instance = Category(name=str(i))
+        instance._tracker = field_counters.new_model_instance_tracker()
+        rows.append(instance)
+    return rows
+
+
+def finalizers():
+    counter = [0]
+
+    def ready():
+        counter[0] += 1
+
+    rows = make_rows()
+    for row in rows:
+        weakref.finalize(row, ready)
+    del rows, row
+    gc.collect()
+    assert counter[0] == NUM_ROWS
+
+
+def sweep():
+    rows = make_rows()
+    refs = [weakref.ref(row) for row in rows]
+    del rows
+    gc.collect()
+    cursor = 0
+    while cursor < len(refs) and refs[cursor]() is None:
+        cursor += 1
+    assert cursor == NUM_ROWS
+
+
+def tracked_values():
+    num_rows = 0
+    for _ in Category.objects.values():
+        num_rows += 1
+    assert num_rows == NUM_ROWS
+
+
+def main():
+    report("rows only", *measure(make_rows))
+    report("weakref.finalize", *measure(finalizers))
+    report("weakref sweep", *measure(sweep))
+
+    old_config = setup_databases(verbosity=0, interactive=False)
+    try:
+        Category.objects.bulk_create(Category(name=str(i)) for i in range(NUM_ROWS))
+        tracker.start()
+        report("tracked .values()", *measure(tracked_values))
+        tracker.stop()
+    finally:
+        teardown_databases(old_config, verbosity=0)
+
+
+if __name__ == "__main__":
+    main()
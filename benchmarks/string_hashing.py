@@ -0,0 +1,56 @@
+"""
+Collision rate and speed of `hash_string` on distinct SQL-like strings,
+for its 64-bit keys and for the same keys truncated to 32 bits.
+
+Usage: PYTHONPATH=src python benchmarks/string_hashing.py [number of strings]
+"""
+
+import os
+import sys
+from time import perf_counter_ns
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from dj_tracker.hash_utils import hash_string  # noqa: E402
+
+NUM_STRINGS = 2_000_000
+
+
+def make_strings(num_strings):
+    tables = ("book", "author", "category", "comment", "tastyrestaurant", "user")
+    for i in range(num_strings):
+        table = tables[i % len(tables)]
+        yield (
+            f'SELECT "tests_{table}"."id", "tests_{table}"."name" '
+            f'FROM "tests_{table}" WHERE "tests_{table}"."id" IN ({i}, {i * 7 + 1}) '
+            f"-- é{i % 97}"
+        )
+
+
+def count_collisions(keys):
+    return len(keys) - len(set(keys))
+
+
+def expected_collisions(num_keys, bits):
+    # Birthday approximation of the number of colliding keys.
+    return num_keys * (num_keys - 1) / 2 / 2**bits
+
+
+if __name__ == "__main__":
+    num_strings = int(sys.argv[1]) if len(sys.argv) > 1 else NUM_STRINGS
+    strings = list(make_strings(num_strings))
+    assert len(set(strings)) == num_strings
+
+    started_at = perf_counter_ns()
+    keys = [hash_string(string) for string in strings]
+    duration = perf_counter_ns() - started_at
+
+    print(f"{num_strings} strings, {duration / num_strings:.0f}ns per hash")
+    for bits, bit_keys in (
+        (64, keys),
+        (32, [key & 0xFFFFFFFF for key in keys]),
+    ):
+        print(
+            f"{bits} bits: {count_collisions(bit_keys)} collisions"
+            f" ({expected_collisions(num_strings, bits):.2g} expected)"
+        )
@@ -0,0 +1,64 @@
+"""
+Cost of `get_traceback` in a deep stack, for a repeated call site
+(served from the fingerprint cache) and for call sites seen for the first time.
+
+Usage: PYTHONPATH=src python benchmarks/traceback_cache.py
+"""
+
+import gc
+import os
+import sys
+from time import perf_counter_ns
+from timeit import repeat
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("DJANGO_SETTINGS_MODULE", "tests.settings")
+
+import django  # noqa: E402
+
+django.setup()
+
+from dj_tracker.traceback import get_traceback  # noqa: E402
+
+DEPTH = 60
+NUMBER = 20_000
+# Fewer than the cache size, so that new call sites don't evict each other.
+NUM_NEW_CALL_SITES = 1000
+
+
+def in_deep_stack(func, depth=DEPTH):
+    if depth:
+        return in_deep_stack(func, depth - 1)
+    return func()
+
+
+def run_query():
+    # Stands for the tracker's wrapper, whose frame isn't part of the traceback.
+    return get_traceback()
+
+
+def repeated_call_site():
+    return min(repeat(run_query, number=NUMBER, repeat=5)) / NUMBER
+
+
+def new_call_sites():
+    namespace = {"run_query": run_query}
+    call_sites = []
+    for i in range(NUM_NEW_CALL_SITES):
+        exec(f"def call_site_{i}():\n    return run_query()", namespace)
+        call_sites.append(namespace[f"call_site_{i}"])
+
+    # Don't time the collection of the objects created above.
+    gc.collect()
+    started_at = perf_counter_ns()
+    for call_site in call_sites:
+        call_site()
+    return (perf_counter_ns() - started_at) / NUM_NEW_CALL_SITES / 1e9
+
+
+if __name__ == "__main__":
+    for label, func in (
+        ("repeated call site", repeated_call_site),
+        ("new call sites", new_call_sites),
+    ):
+        print(f"{label:>20}: {in_deep_stack(func) * 1e6:.2f}us per call")
@@ -12,7 +12,13 @@ extensions = [
         sources=[f"src/dj_tracker/{module}.pyx"],
         define_macros=MACROS,
     )
-    for module in ("cache_utils", "hash_utils", "traceback")
+    for module in (
+        "cache_utils",
+        "hash_utils",
+        "traceback",
+        "tracked_rows",
+        "_field_descriptors",
+    )
 ]
 
 try:
@@ -0,0 +1,96 @@
+# Compiled versions of the field descriptors in `field_descriptors.py`,
+# which run on every field access of tracked instances.
+
+from cpython cimport array
+
+from functools import wraps
+
+from dj_tracker.patching import patch
+
+
+cdef extern from "Python.h":
+    dict PyObject_GenericGetDict(object obj, void *context)
+
+
+cdef inline object get_instance_tracker(object instance):
+    # Reads `_tracker` from the instance's `__dict__`,
+    # bypassing the `__getattribute__` of tracking classes.
+    if instance is None:
+        return None
+    return PyObject_GenericGetDict(instance, NULL).get("_tracker")
+
+
+cdef inline void add_count(object instance_tracker, str field, Py_ssize_t kind):
+    # Increments the get (kind=0) or set (kind=1) counter of the instance's row
+    # directly in its `FieldCounters` column when it's already allocated.
+    cdef:
+        Py_ssize_t row = instance_tracker.row
+        object counters = instance_tracker.counters
+        object column = (<dict?>counters.columns).get(field)
+        array.array counts
+
+    if column is not None:
+        counts = (<tuple?>column)[kind]
+        if row < len(counts):
+            counts.data.as_ulongs[row] += 1
+            return
+
+    if kind == 0:
+        counters.add_get(field, row)
+    else:
+        counters.add_set(field, row)
+
+
+cdef class FieldDescriptor:
+    cdef readonly object descriptor
+    cdef readonly str attname
+
+    def __init__(self, descriptor, attname):
+        self.descriptor = descriptor
+        self.attname = attname
+
+    def __get__(self, instance, cls):
+        if (instance_tracker := get_instance_tracker(instance)) is not None:
+            add_count(instance_tracker, self.attname, 0)
+
+        return self.descriptor.__get__(instance, cls)
+
+
+cdef class DeferredAttributeDescriptor(FieldDescriptor):
+    def __init__(self, descriptor, attname):
+        super().__init__(descriptor, attname)
+        patch(
+            descriptor,
+            "_check_parent_chain",
+            self.wrap_check_parent_chain(descriptor._check_parent_chain, attname),
+        )
+
+    @staticmethod
+    def wrap_check_parent_chain(_check_parent_chain, attname):
+        @wraps(_check_parent_chain)
+        def wrapper(instance):
+            value = _check_parent_chain(instance)
+            if (
+                value is None
+                and (instance_tracker := get_instance_tracker(instance)) is not None
+            ):
+                instance_tracker.queryset.add_deferred_field(attname, instance)
+
+            return value
+
+        return wrapper
+
+    def __set__(self, instance, value):
+        PyObject_GenericGetDict(instance, NULL)[self.attname] = value
+        if (instance_tracker := get_instance_tracker(instance)) is not None:
+            add_count(instance_tracker, self.attname, 1)
+
+    def __delete__(self, instance):
+        del PyObject_GenericGetDict(instance, NULL)[self.attname]
+
+
+cdef class EditableFieldDescriptor(FieldDescriptor):
+    def __set__(self, instance, value):
+        self.descriptor.__set__(instance, value)
+        if (instance_tracker := get_instance_tracker(instance)) is not None:
+            add_count(instance_tracker, self.attname, 1)
@@ -1,62 +1,194 @@
 import atexit
+import os
 import threading
+from collections import deque
+from time import monotonic, time
 
-from dj_tracker.constants import COLLECTION_INTERVAL
+from dj_tracker.constants import (
+    COLLECTION_INTERVAL,
+    COLLECTOR_PROCESS,
+    MAX_TRACKER_AGE,
+)
 from dj_tracker.logging import logger
 
 
 class Collector:
     thread = None
+    # The `CollectorProcess` saving trackings, when `COLLECTOR_PROCESS` is set.
+    process = None
     stopping = threading.Event()
 
-    trackers = set()
+    # Operations staged by each thread, as `(thread, buffer)` pairs.
+    # Only the thread draining them touches the containers and counters below.
+    buffers = []
+    # Reentrant: garbage collected while it's held, trackers may stage operations
+    # (e.g from weakref callbacks) from a thread that has no buffer yet.
+    buffers_lock = threading.RLock()
+    drain_lock = threading.Lock()
+    local = threading.local()
+
+    # Active trackers and requests, mapped to the time they were added at.
+    trackers = {}
     trackers_ready = []
     num_trackers = 0
     num_trackers_saved = 0
+    num_trackers_not_done = 0
+    # Trackers saved after `MAX_TRACKER_AGE` while some of their instances were alive.
+    num_trackers_flushed = 0
 
-    requests = set()
+    requests = {}
     requests_ready = []
     num_requests = 0
     num_requests_saved = 0
+    num_requests_discarded = 0
+    num_requests_flushed = 0
+
+    num_collections = 0
+    last_collection_at = None
+
+    @classmethod
+    def get_buffer(cls):
+        try:
+            return cls.local.buffer
+        except AttributeError:
+            cls.local.buffer = buffer = deque()
+            with cls.buffers_lock:
+                cls.buffers.append((threading.current_thread(), buffer))
+            return buffer
 
     @classmethod
     def add_tracker(cls, tracker):
+        cls.get_buffer().append((cls._add_tracker, tracker))
+
+    @classmethod
+    def add_request(cls, request):
+        cls.get_buffer().append((cls._add_request, request))
+
+    @classmethod
+    def tracker_ready(cls, tracker):
+        cls.get_buffer().append((cls._tracker_ready, tracker))
+
+    @classmethod
+    def request_ready(cls, request):
+        cls.get_buffer().append((cls._request_ready, request))
+
+    @classmethod
+    def request_discarded(cls, request):
+        cls.get_buffer().append((cls._request_discarded, request))
+
+    @classmethod
+    def drain(cls):
+        """
+        Applies the operations staged by all threads, in the order
+        each thread staged them. Buffers of finished threads are dropped once empty.
+        """
+        with cls.drain_lock:
+            with cls.buffers_lock:
+                buffers = cls.buffers[:]
+
+            for thread, buffer in buffers:
+                alive = thread.is_alive()
+                pop = buffer.popleft
+                # Only what's staged so far, the thread may still be appending.
+                for _ in range(len(buffer)):
+                    apply, obj = pop()
+                    apply(obj)
+
+                if not alive and not buffer:
+                    with cls.buffers_lock:
+                        cls.buffers.remove((thread, buffer))
+
+    # Operations staged by the methods above. A tracker (or a request)
+    # may have become ready before being added, or be marked as ready from
+    # another thread before its addition is applied: readiness is checked
+    # again when the addition is applied.
+
+    @classmethod
+    def _add_tracker(cls, tracker):
         cls.num_trackers += 1
         if not tracker.ready:
-            cls.trackers.add(tracker)
+            cls.trackers[tracker] = monotonic()
         else:
             cls.trackers_ready.append(tracker)
 
     @classmethod
-    def add_request(cls, request):
-        cls.requests.add(request)
+    def _add_request(cls, request):
         cls.num_requests += 1
+        if not request.retained:
+            # Counted by `_request_discarded`.
+            return
+
+        if not request.ready:
+            cls.requests[request] = monotonic()
+        else:
+            cls.requests_ready.append(request)
 
     @classmethod
-    def tracker_ready(cls, tracker):
+    def _tracker_ready(cls, tracker):
         # May not be in active yet for related querysets trackers,
         # or may have already been saved (when the worker stops).
-        try:
-            cls.trackers.remove(tracker)
-        except KeyError:
-            pass
-        else:
+        # Readiness sweeps the tracker's instances: it's only checked from here,
+        # by the thread draining operations, as concurrent sweeps would miscount them.
+        if tracker in cls.trackers and tracker.ready:
+            del cls.trackers[tracker]
             cls.trackers_ready.append(tracker)
 
     @classmethod
-    def request_ready(cls, request):
-        try:
-            cls.requests.remove(request)
-        except KeyError:
-            pass
-        else:
+    def _request_ready(cls, request):
+        if cls.requests.pop(request, None) is not None:
             cls.requests_ready.append(request)
 
+    @classmethod
+    def _request_discarded(cls, request):
+        cls.requests.pop(request, None)
+        cls.num_requests_discarded += 1
+
+    @classmethod
+    def sweep_trackers(cls):
+        cls.drain()
+        # Instances don't notify their queryset tracker when they're collected,
+        # active trackers are checked periodically instead.
+        for tracker in list(cls.trackers):
+            cls._tracker_ready(tracker)
+
+        if MAX_TRACKER_AGE:
+            cls.flush_trackers(monotonic() - MAX_TRACKER_AGE)
+
+    @classmethod
+    def flush_trackers(cls, added_before):
+        """
+        Saves the trackers and finished requests added before `added_before`
+        even though they aren't ready, so that instances kept alive
+        (e.g by a module-level cache) don't retain them forever.
+        """
+        trackers = cls.trackers
+        for tracker, added_at in list(trackers.items()):
+            if added_at < added_before:
+                del trackers[tracker]
+                if tracker._iter_done:
+                    tracker.flushed = True
+                    cls.trackers_ready.append(tracker)
+                    cls.num_trackers_flushed += 1
+                else:
+                    cls.num_trackers_not_done += 1
+
+        requests = cls.requests
+        for request, added_at in list(requests.items()):
+            # Requests still running are only saved once they finish:
+            # with `TAIL_RETENTION`, they may still be discarded.
+            if added_at < added_before and request.finished:
+                del requests[request]
+                cls.requests_ready.append(request)
+                cls.num_requests_flushed += 1
+
     @classmethod
     def save_trackers(cls):
         from dj_tracker.datastructures import QuerySetTracker
 
-        num_saved = QuerySetTracker.save_trackers(cls.trackers_ready[:])
+        num_saved = QuerySetTracker.save_trackers(
+            cls.trackers_ready[:],
+            cls.process and cls.process.save_queryset_states,
+        )
         cls.trackers_ready[:num_saved] = []
         cls.num_trackers_saved += num_saved
 
@@ -64,15 +196,101 @@ class Collector:
     def save_requests(cls):
         from dj_tracker.datastructures import RequestTracker
 
-        num_saved = RequestTracker.save_trackers(cls.requests_ready[:])
+        num_saved = RequestTracker.save_trackers(
+            cls.requests_ready[:],
+            cls.process and cls.process.save_request_states,
+        )
         cls.requests_ready[:num_saved] = []
         cls.num_requests_saved += num_saved
 
+    @classmethod
+    def save_counts(cls):
+        from dj_tracker.datastructures import DummyRequestTracker, RequestTracker
+
+        if process := cls.process:
+            process.save_queries()
+            process.save_discarded()
+        else:
+            DummyRequestTracker.save_queries()
+            RequestTracker.save_discarded()
+
+    @classmethod
+    def stats(cls):
+        """Counters of the collector of the current process."""
+        return {
+            "pid": os.getpid(),
+            "running": cls.thread is not None and cls.thread.is_alive(),
+            "process": cls.process and cls.process.pid,
+            "num_staged": sum(len(buffer) for _, buffer in cls.buffers),
+            "num_collections": cls.num_collections,
+            "last_collection_at": cls.last_collection_at,
+            "num_trackers": cls.num_trackers,
+            "num_trackers_active": len(cls.trackers),
+            "num_trackers_ready": len(cls.trackers_ready),
+            "num_trackers_saved": cls.num_trackers_saved,
+            "num_trackers_not_done": cls.num_trackers_not_done,
+            "num_trackers_flushed": cls.num_trackers_flushed,
+            "num_requests": cls.num_requests,
+            "num_requests_active": len(cls.requests),
+            "num_requests_ready": len(cls.requests_ready),
+            "num_requests_saved": cls.num_requests_saved,
+            "num_requests_discarded": cls.num_requests_discarded,
+            "num_requests_flushed": cls.num_requests_flushed,
+        }
+
+    @classmethod
+    def after_fork(cls):
+        """
+        Runs in child processes. The collector thread doesn't survive `fork()`:
+        the state inherited from the parent, which the parent saves itself, is dropped
+        and a collector is started for the child if the parent was running one.
+        """
+        if cls.thread is None:
+            return
+
+        from dj_tracker.datastructures import DummyRequestTracker, RequestTracker
+        from dj_tracker.promise import Promise
+
+        cls.thread = None
+        # The parent's process is stopped by the parent.
+        cls.process = None
+        # The parent's event and locks may have been forked in an undefined state.
+        cls.stopping = threading.Event()
+        cls.buffers_lock = threading.RLock()
+        cls.drain_lock = threading.Lock()
+        # Staged operations of the parent's threads were copied along.
+        cls.buffers = []
+        cls.local = threading.local()
+        # Locks of the request threads and of the parent's collector.
+        DummyRequestTracker.lock = threading.Lock()
+        RequestTracker.discarded_lock = threading.Lock()
+        Promise.after_fork()
+
+        for container in (
+            cls.trackers,
+            cls.trackers_ready,
+            cls.requests,
+            cls.requests_ready,
+            DummyRequestTracker.queries,
+            RequestTracker.discarded,
+        ):
+            container.clear()
+
+        cls.num_trackers = cls.num_trackers_saved = 0
+        cls.num_trackers_not_done = cls.num_trackers_flushed = 0
+        cls.num_requests = cls.num_requests_saved = 0
+        cls.num_requests_discarded = cls.num_requests_flushed = 0
+        cls.num_collections = 0
+        cls.last_collection_at = None
+
+        cls.start()
+
     @classmethod
     def start(cls):
         assert cls.thread is None and not cls.stopping.is_set()
         cls.thread = threading.Thread(target=cls.run, daemon=True)
         cls.thread.start()
+        atexit.unregister(cls.stop)
         atexit.register(cls.stop)
 
     @classmethod
@@ -81,46 +299,95 @@ class Collector:
             cls.stopping.set()
             cls.thread.join()
             cls.thread = None
+            # Allow restarting the collector.
+            cls.stopping.clear()
+
+    @classmethod
+    def start_process(cls):
+        """Starts the `CollectorProcess`, trackings are saved by the collector thread if it fails."""
+        from dj_tracker.collector_process import CollectorProcess
+
+        try:
+            cls.process = CollectorProcess.spawn()
+        except Exception:
+            logger.exception(
+                f"Failed to start the collector process, saving trackings in process {os.getpid()}"
+            )
 
     @classmethod
     def run(cls):
-        from dj_tracker.datastructures import DummyRequestTracker
+        from dj_tracker.datastructures import DummyRequestTracker, RequestTracker
 
         should_stop = cls.stopping.wait
+        sweep_trackers = cls.sweep_trackers
         save_trackers = cls.save_trackers
         save_requests = cls.save_requests
+        save_counts = cls.save_counts
         ready_trackers = cls.trackers_ready
         ready_requests = cls.requests_ready
 
-        logger.info("Collector running")
+        if COLLECTOR_PROCESS:
+            cls.start_process()
+
+        if cls.process:
+            logger.info(
+                f"Collector running in process {os.getpid()},"
+                f" saving trackings in process {cls.process.pid}"
+            )
+        else:
+            logger.info(f"Collector running in process {os.getpid()}")
 
         while not should_stop(COLLECTION_INTERVAL):
-            if ready_trackers:
-                save_trackers()
-            if ready_requests:
-                save_requests()
-            DummyRequestTracker.save_queries()
+            cls.num_collections += 1
+            cls.last_collection_at = time()
+            # Trackers and requests that failed to be saved are retried by the next collection.
+            try:
+                sweep_trackers()
+                if ready_trackers:
+                    save_trackers()
+                if ready_requests:
+                    save_requests()
+                save_counts()
+            except Exception:
+                logger.exception("Collector failed to save trackings")
 
         logger.info("Saving latest trackings...")
 
-        iter_not_done = 0
         active_trackers = cls.trackers
+        cls.drain()
         while active_trackers or ready_trackers:
             num_ready = len(ready_trackers)
             ready_trackers.extend(obj for obj in active_trackers if obj._iter_done)
-            iter_not_done += len(active_trackers) - (len(ready_trackers) - num_ready)
+            cls.num_trackers_not_done += len(active_trackers) - (
+                len(ready_trackers) - num_ready
+            )
             active_trackers.clear()
             save_trackers()
+            # Saving trackers stages the trackers of their related querysets.
+            cls.drain()
 
         ready_requests.extend(cls.requests)
         cls.requests.clear()
         if ready_requests:
             save_requests()
 
-        DummyRequestTracker.save_queries()
+        save_counts()
+        if cls.process:
+            cls.process.stop()
+            cls.process = None
 
-        assert cls.num_trackers_saved + iter_not_done == cls.num_trackers
-        assert cls.num_requests_saved == cls.num_requests
+        assert cls.num_trackers_saved + cls.num_trackers_not_done == cls.num_trackers
+        assert cls.num_requests_saved + cls.num_requests_discarded == cls.num_requests
         assert not DummyRequestTracker.queries
+        assert not RequestTracker.discarded
+
+        logger.info(
+            f"Collector of process {os.getpid()} stopped:"
+            f" {cls.num_trackers_saved} queries tracked"
+            f" ({cls.num_trackers_flushed} flushed before being ready)."
+        )
+
 
-        logger.info(f"Collector stopped: {cls.num_trackers_saved} queries tracked.")
+# Preloading servers (e.g `gunicorn --preload`) fork workers after the collector started.
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=Collector.after_fork)
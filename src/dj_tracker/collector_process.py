@@ -0,0 +1,168 @@
+import multiprocessing
+import os
+
+from django.core.exceptions import ImproperlyConfigured
+
+from dj_tracker.logging import logger
+
+# Collector processes started by a `CollectorProcess` after the first one stopped.
+MAX_RESTARTS = 3
+
+
+def get_methods():
+    from dj_tracker.datastructures import (
+        DummyRequestTracker,
+        QuerySetTracker,
+        RequestTracker,
+    )
+
+    return {
+        "save_queryset_states": QuerySetTracker.save_states,
+        "save_request_states": RequestTracker.save_states,
+        "save_queries": DummyRequestTracker.save_queries,
+        "save_discarded": RequestTracker.save_discarded,
+    }
+
+
+def serve(conn, settings_module):
+    """
+    Runs in the collector process: saves what the `Collector` of a web
+    worker sends through `conn` until it sends `None`.
+    """
+    os.environ["DJANGO_SETTINGS_MODULE"] = settings_module
+
+    import django
+
+    django.setup()
+
+    methods = get_methods()
+
+    while (message := conn.recv()) is not None:
+        method, args = message
+        try:
+            result = methods[method](*args)
+        except Exception as exc:
+            logger.exception(f"Collector process failed to run {method}")
+            result = exc
+
+        conn.send(result)
+
+    conn.close()
+
+
+class CollectorProcess:
+    """
+    Saves trackings in a separate process, so that hashing, resolving promises
+    and creating objects don't compete with request threads for the GIL.
+    The `Collector` keeps watching trackers in the web worker and sends
+    the state of the ready ones through a pipe, waiting for the result.
+    """
+
+    __slots__ = ("conn", "worker", "settings_module", "num_restarts")
+
+    def __init__(self, conn, worker, settings_module=None):
+        self.conn = conn
+        self.worker = worker
+        self.settings_module = settings_module
+        self.num_restarts = 0
+
+    @classmethod
+    def spawn(cls, settings_module=None):
+        if not settings_module:
+            from django.conf import settings
+
+            if not (settings_module := settings.SETTINGS_MODULE):
+                raise ImproperlyConfigured(
+                    "COLLECTOR_PROCESS requires a settings module: the collector"
+                    " process can't load settings passed to settings.configure()."
+                )
+
+        return cls(*cls.start_worker(settings_module), settings_module)
+
+    @staticmethod
+    def start_worker(settings_module):
+        # Forking a process running threads isn't safe.
+        context = multiprocessing.get_context("spawn")
+        conn, child_conn = context.Pipe()
+        worker = context.Process(
+            target=serve,
+            args=(child_conn, settings_module),
+            name="dj_tracker collector",
+            daemon=True,
+        )
+        worker.start()
+        child_conn.close()
+        return conn, worker
+
+    @property
+    def pid(self):
+        """The pid of the collector process, `None` while saving in the current process."""
+        return self.worker.pid if self.conn is not None else None
+
+    def call(self, method, *args):
+        if (conn := self.conn) is not None:
+            try:
+                conn.send((method, args))
+                result = conn.recv()
+            except (EOFError, OSError):
+                logger.exception(
+                    f"Collector process {self.worker.pid} stopped while running {method}"
+                )
+                conn.close()
+                self.conn = None
+            else:
+                if isinstance(result, Exception):
+                    raise result
+                return result
+
+        # What the collector process may have saved before stopping is saved again:
+        # queries and trackings are only created once but some counts can be
+        # incremented twice.
+        result = get_methods()[method](*args)
+        self.restart()
+        return result
+
+    def restart(self):
+        if self.num_restarts >= MAX_RESTARTS:
+            return
+
+        self.num_restarts += 1
+        try:
+            self.conn, self.worker = self.start_worker(self.settings_module)
+        except Exception:
+            logger.exception(
+                f"Failed to restart the collector process, saving trackings in process {os.getpid()}"
+            )
+        else:
+            logger.info(f"Collector process restarted as process {self.worker.pid}")
+
+    def save_queryset_states(self, states):
+        return self.call("save_queryset_states", states)
+
+    def save_request_states(self, states):
+        return self.call("save_request_states", states)
+
+    def save_queries(self):
+        from dj_tracker.datastructures import DummyRequestTracker
+
+        if DummyRequestTracker.queries:
+            self.call("save_queries", DummyRequestTracker.pop_queries())
+
+    def save_discarded(self):
+        from dj_tracker.datastructures import RequestTracker
+
+        if RequestTracker.discarded:
+            self.call("save_discarded", RequestTracker.pop_discarded())
+
+    def stop(self):
+        if (conn := self.conn) is None:
+            return
+
+        try:
+            conn.send(None)
+        except OSError:
+            # The collector process already stopped.
+            pass
+        self.worker.join()
+        conn.close()
+        self.conn = None
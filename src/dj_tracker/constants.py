@@ -8,9 +8,23 @@ will result in calling `_get_tracked_models` on first access and set the value i
 This is achieved through the `__getattr__` hook. See PEP 562 for more details.
 """
 
+from enum import IntEnum
+
 DJ_TRACKER_SETTINGS = None
 
 
+class TrackingLevel(IntEnum):
+    OFF = 0
+    # Number of queries and their durations per request.
+    COUNTS = 1
+    # Queries with their SQL and traceback.
+    QUERIES = 2
+    # Field usage of model instances and rows returned by queries.
+    INSTANCES = 3
+    # Attributes accessed on model instances.
+    ATTRIBUTES = 4
+
+
 def __getattr__(name):
     if getter := globals().pop(f"_get_{name.lower()}", None):
         globals()[name] = value = getter()
@@ -28,12 +42,30 @@ def _set_dj_tracker_settings():
     from django.conf import settings
 
     DJ_TRACKER_SETTINGS = {
+        "TRACKING_LEVEL": None,
         "TRACK_ATTRIBUTES_ACCESSED": True,
         "COLLECTION_INTERVAL": 5,
+        "MAX_TRACKER_AGE": None,
         "FIELD_DESCRIPTORS": {},
         "APPS_TO_EXCLUDE": (),
+        "APPS_TO_INCLUDE": None,
+        "MODELS_TO_INCLUDE": None,
+        "LAZY_INSTRUMENTATION": False,
+        "PATCH_THREAD_POOL_EXECUTOR": False,
+        "COLLECTOR_PROCESS": False,
         "IGNORE_MODULES": (),
         "IGNORE_PATHS": (),
+        "SAMPLE_RATE": 1,
+        "SAMPLE_RATES": {},
+        "ADAPTIVE_SAMPLING_THRESHOLD": None,
+        "ADAPTIVE_SAMPLING_MAX_INTERVAL": 1024,
+        "TAIL_RETENTION": False,
+        "SLOW_REQUEST_THRESHOLD": 500,
+        "NUM_QUERIES_THRESHOLD": 20,
+        "ON_DEMAND_TRACKING": False,
+        "ON_DEMAND_TOKEN_MAX_AGE": 3600,
+        "CONTROL_FILE": None,
+        "PATHS_CACHE_SIZE": 4096,
     }
     DJ_TRACKER_SETTINGS.update(getattr(settings, "DJ_TRACKER", {}))
 
@@ -45,23 +77,56 @@ def _get_tracked_models():
 
     _set_dj_tracker_settings()
     apps_to_exclude = {"dj_tracker", *DJ_TRACKER_SETTINGS.pop("APPS_TO_EXCLUDE")}
+    apps_to_include = DJ_TRACKER_SETTINGS.pop("APPS_TO_INCLUDE")
+    models_to_include = DJ_TRACKER_SETTINGS.pop("MODELS_TO_INCLUDE")
+    models = chain.from_iterable(
+        app.get_models(include_auto_created=True)
+        for app in apps.get_app_configs()
+        if app.label not in apps_to_exclude
+    )
+
+    if apps_to_include is None and models_to_include is None:
+        return frozenset(models)
+
+    # With allowlists, only models of the included apps and the included models are tracked.
+    apps_to_include = set(apps_to_include or ())
+    models_to_include = {label.lower() for label in models_to_include or ()}
     return frozenset(
-        chain.from_iterable(
-            app.get_models(include_auto_created=True)
-            for app in apps.get_app_configs()
-            if app.label not in apps_to_exclude
-        )
+        model
+        for model in models
+        if model._meta.app_label in apps_to_include
+        or model._meta.label_lower in models_to_include
     )
 
 
+def _get_lazy_instrumentation():
+    _set_dj_tracker_settings()
+    return DJ_TRACKER_SETTINGS.pop("LAZY_INSTRUMENTATION")
+
+
+def _get_patch_thread_pool_executor():
+    _set_dj_tracker_settings()
+    return DJ_TRACKER_SETTINGS.pop("PATCH_THREAD_POOL_EXECUTOR")
+
+
+def _get_collector_process():
+    _set_dj_tracker_settings()
+    return DJ_TRACKER_SETTINGS.pop("COLLECTOR_PROCESS")
+
+
 def _get_ignored_modules():
     _set_dj_tracker_settings()
     return {
         "wsgiref",
         "gunicorn",
+        "uvicorn",
+        "daphne",
         "unittest",
         "threading",
         "socketserver",
+        "asyncio",
+        "asgiref",
+        "concurrent/futures",
         "dj_tracker",
         "django/db",
         "django/template",
@@ -82,6 +147,61 @@ def _get_ignored_paths():
     return {"/dj-tracker/", *DJ_TRACKER_SETTINGS.pop("IGNORE_PATHS")}
 
 
+def _get_paths_cache_size():
+    _set_dj_tracker_settings()
+    return DJ_TRACKER_SETTINGS.pop("PATHS_CACHE_SIZE")
+
+
+def _get_sample_rate():
+    _set_dj_tracker_settings()
+    return DJ_TRACKER_SETTINGS.pop("SAMPLE_RATE")
+
+
+def _get_sample_rates():
+    _set_dj_tracker_settings()
+    return DJ_TRACKER_SETTINGS.pop("SAMPLE_RATES")
+
+
+def _get_adaptive_sampling_threshold():
+    _set_dj_tracker_settings()
+    return DJ_TRACKER_SETTINGS.pop("ADAPTIVE_SAMPLING_THRESHOLD")
+
+
+def _get_adaptive_sampling_max_interval():
+    _set_dj_tracker_settings()
+    return DJ_TRACKER_SETTINGS.pop("ADAPTIVE_SAMPLING_MAX_INTERVAL")
+
+
+def _get_tail_retention():
+    _set_dj_tracker_settings()
+    return DJ_TRACKER_SETTINGS.pop("TAIL_RETENTION")
+
+
+def _get_slow_request_threshold():
+    _set_dj_tracker_settings()
+    return DJ_TRACKER_SETTINGS.pop("SLOW_REQUEST_THRESHOLD")
+
+
+def _get_num_queries_threshold():
+    _set_dj_tracker_settings()
+    return DJ_TRACKER_SETTINGS.pop("NUM_QUERIES_THRESHOLD")
+
+
+def _get_on_demand_tracking():
+    _set_dj_tracker_settings()
+    return DJ_TRACKER_SETTINGS.pop("ON_DEMAND_TRACKING")
+
+
+def _get_on_demand_token_max_age():
+    _set_dj_tracker_settings()
+    return DJ_TRACKER_SETTINGS.pop("ON_DEMAND_TOKEN_MAX_AGE")
+
+
+def _get_control_file():
+    _set_dj_tracker_settings()
+    return DJ_TRACKER_SETTINGS.pop("CONTROL_FILE")
+
+
 def _get_extra_descriptors():
     from django.utils.module_loading import import_string
 
@@ -92,9 +212,16 @@ def _get_extra_descriptors():
     }
 
 
-def _get_track_attributes_accessed():
+def _get_tracking_level():
     _set_dj_tracker_settings()
-    return DJ_TRACKER_SETTINGS.pop("TRACK_ATTRIBUTES_ACCESSED")
+    track_attributes_accessed = DJ_TRACKER_SETTINGS.pop("TRACK_ATTRIBUTES_ACCESSED")
+    if (level := DJ_TRACKER_SETTINGS.pop("TRACKING_LEVEL")) is None:
+        level = (
+            TrackingLevel.ATTRIBUTES
+            if track_attributes_accessed
+            else TrackingLevel.INSTANCES
+        )
+    return TrackingLevel(level)
 
 
 def _get_collection_interval():
@@ -102,6 +229,11 @@ def _get_collection_interval():
     return DJ_TRACKER_SETTINGS.pop("COLLECTION_INTERVAL")
 
 
+def _get_max_tracker_age():
+    _set_dj_tracker_settings()
+    return DJ_TRACKER_SETTINGS.pop("MAX_TRACKER_AGE")
+
+
 def _get_trackings_db():
     from django.conf import settings
 
@@ -109,4 +241,6 @@ def _get_trackings_db():
 
 
 def _get_dummy_request():
-    return type("DummyRequest", (), {"path": "", "_ignore_path": False})
+    from dj_tracker.constants import TRACKING_LEVEL
+
+    return type("DummyRequest", (), {"path": "", "_tracking_level": TRACKING_LEVEL})
@@ -1,7 +1,52 @@
-from contextvars import ContextVar
+from concurrent.futures import ThreadPoolExecutor
+from contextvars import ContextVar, copy_context
+from functools import wraps
 
 from dj_tracker.constants import DUMMY_REQUEST
 
 request_var = ContextVar("request", default=DUMMY_REQUEST)
 get_request = request_var.get
 set_request = request_var.set
+
+# Traceback of an async caller, captured on the event loop before
+# its query runs in a `sync_to_async` thread.
+caller_traceback_var = ContextVar("caller_traceback", default=None)
+get_caller_traceback = caller_traceback_var.get
+set_caller_traceback = caller_traceback_var.set
+reset_caller_traceback = caller_traceback_var.reset
+
+# Set while the rows of a call site skipped by adaptive sampling are built,
+# so that their instances aren't tracked in the first place.
+untracked_var = ContextVar("untracked", default=False)
+is_untracked = untracked_var.get
+set_untracked = untracked_var.set
+reset_untracked = untracked_var.reset
+
+
+def with_context(func):
+    """
+    Returns a callable running `func` in a copy of the current context,
+    so that queries it runs in another thread are tracked with the current request.
+    """
+    context = copy_context()
+
+    @wraps(func)
+    def wrapper(*args, **kwargs):
+        # A context can't be entered by several threads at once.
+        return context.copy().run(func, *args, **kwargs)
+
+    return wrapper
+
+
+_submit = ThreadPoolExecutor.submit
+
+
+def submit_with_context(executor, fn, /, *args, **kwargs):
+    """`ThreadPoolExecutor.submit` running `fn` in a copy of the submitter's context."""
+    return _submit(executor, copy_context().run, fn, *args, **kwargs)
+
+
+class ContextThreadPoolExecutor(ThreadPoolExecutor):
+    """A `ThreadPoolExecutor` whose tasks are tracked with the request submitting them."""
+
+    submit = submit_with_context
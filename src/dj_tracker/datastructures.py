@@ -1,21 +1,36 @@
 import collections.abc
 import functools
+import sys
+import threading
 import uuid
 import weakref
-from collections import Counter, defaultdict, deque
-from itertools import chain
+from array import array
+from collections import Counter, defaultdict
 
 from django.db import transaction
 from django.utils.timezone import now
 
-from dj_tracker.cache_utils import LazySlots, lazy_attribute
+from dj_tracker.cache_utils import LazySlots, LRUCache, lazy_attribute
 from dj_tracker.collector import Collector
-from dj_tracker.constants import DUMMY_REQUEST, TRACKINGS_DB
+from dj_tracker.constants import (
+    ADAPTIVE_SAMPLING_MAX_INTERVAL,
+    ADAPTIVE_SAMPLING_THRESHOLD,
+    DUMMY_REQUEST,
+    NUM_QUERIES_THRESHOLD,
+    SLOW_REQUEST_THRESHOLD,
+    TAIL_RETENTION,
+    TRACKINGS_DB,
+)
 from dj_tracker.context import get_request
 from dj_tracker.hash_utils import HashableCounter, HashableMixin
-from dj_tracker.models import QueryGroup, QuerySetTracking, Tracking
+from dj_tracker.models import QueryGroup, QuerySetTracking, RequestCount, Tracking
 from dj_tracker.promise import QueryGroupPromise, QueryPromise, RequestPromise
 from dj_tracker.traceback import get_traceback
+from dj_tracker.tracked_rows import (
+    RowCounters,
+    make_tracked_dict,
+    make_tracked_sequence,
+)
 
 weak_reference = weakref.ref
 weakref_finalize = weakref.finalize
@@ -35,59 +50,6 @@ class TrackedObject:
         return repr(self.tracked)
 
 
-class TrackedDict(TrackedObject, collections.abc.MutableMapping):
-    __slots__ = ()
-
-    def __getitem__(self, name):
-        try:
-            value = dict.__getitem__(self.tracked, name)
-        except KeyError:
-            raise
-        else:
-            self._tracker.get_field_tracker(name).get += 1
-            return value
-
-    def __setitem__(self, key, value):
-        dict.__setitem__(self.tracked, key, value)
-
-    def __delitem__(self, key):
-        dict.__delitem__(self.tracked, key)
-
-    def __iter__(self):
-        return iter(self.tracked)
-
-
-@functools.total_ordering
-class TrackedSequence(TrackedObject, collections.abc.Sequence):
-    __slots__ = ()
-
-    def __getitem__(self, index):
-        try:
-            value = self.tracked.__getitem__(index)
-        except IndexError:
-            raise
-        else:
-            if type(index) is int:
-                self._tracker.get_field_tracker(str(index)).get += 1
-            else:
-                for i in range(
-                    index.start if index.start is not None else 0,
-                    index.stop if index.stop is not None else len(self.tracked),
-                    index.step if index.step else 1,
-                ):
-                    self._tracker.get_field_tracker(str(i)).get += 1
-            return value
-
-    def __lt__(self, other):
-        return self.tracked < other
-
-    def __eq__(self, other):
-        return self.tracked == other
-
-    def __hash__(self):
-        return hash(self.tracked)
-
-
 class TrackedResultCache(TrackedObject, collections.abc.Sequence):
     __slots__ = ()
 
@@ -99,15 +61,15 @@ class TrackedResultCache(TrackedObject, collections.abc.Sequence):
         return self.tracked.__getitem__(index)
 
     def __len__(self):
-        self._tracker["len_calls"] = self._tracker.get("len_calls", 0) + 1
+        self._tracker.len_calls = (self._tracker.len_calls or 0) + 1
         return len(self.tracked)
 
     def __contains__(self, value):
-        self._tracker["contains_calls"] = self._tracker.get("contains_calls", 0) + 1
+        self._tracker.contains_calls = (self._tracker.contains_calls or 0) + 1
         return value in self.tracked
 
     def __bool__(self):
-        self._tracker["exists_calls"] = self._tracker.get("exists_calls", 0) + 1
+        self._tracker.exists_calls = (self._tracker.exists_calls or 0) + 1
         return bool(self.tracked)
 
 
@@ -115,8 +77,9 @@ class TrackedResultCache(TrackedObject, collections.abc.Sequence):
 class FieldTracker(HashableMixin):
     __slots__ = ("get", "set")
 
-    def __init__(self):
-        self.get = self.set = 0
+    def __init__(self, get=0, set=0):
+        self.get = get
+        self.set = set
 
     __hash__ = HashableMixin.__hash__
 
@@ -141,27 +104,178 @@ class FieldTracker(HashableMixin):
         return f"get: {self.get}, set: {self.set}"
 
 
-class InstanceTracker(dict):
-    __slots__ = ()
+class FieldCounters:
+    """
+    Columnar field access counters of the instances (or rows) returned by a query:
+    one array of get counts and one of set counts per field, indexed by row.
+    Columns are created on the first access to a field and only grow up to the
+    last row accessed, so rows whose fields aren't used cost nothing.
+    """
 
-    def __missing__(self, field):
-        return
+    __slots__ = ("__weakref__", "field_names", "columns", "num_rows")
 
-    def __getitem__(self, field, dict_get_item=dict.__getitem__):
-        if not (field_tracker := dict_get_item(self, field)):
-            self[field] = field_tracker = FieldTracker()
-        return field_tracker
+    def __init__(self, field_names):
+        # Fields loaded from the database, reported even when they aren't used.
+        self.field_names = dict.fromkeys(field_names)
+        self.columns = {}
+        self.num_rows = 0
 
-    get_field_tracker = __getitem__
+    def new_row(self):
+        row = self.num_rows
+        self.num_rows = row + 1
+        return row
 
-    def __getstate__(self):
-        return {"values": dict(self)}
+    def new_instance_tracker(self):
+        return InstanceTracker(self, self.new_row())
 
-    def __setstate__(self, state):
-        self.update(state["values"])
+    def new_model_instance_tracker(self):
+        return ModelInstanceTracker(self, self.new_row())
 
+    def get_column(self, field, row):
+        if (column := self.columns.get(field)) is None:
+            self.columns[field] = column = (array("L"), array("L"))
 
-new_instance_tracker = InstanceTracker.fromkeys
+        for counts in column:
+            if (num_missing := row + 1 - len(counts)) > 0:
+                counts.frombytes(bytes(num_missing * counts.itemsize))
+
+        return column
+
+    def add_get(self, field, row):
+        try:
+            self.columns[field][0][row] += 1
+        except (KeyError, IndexError):
+            self.get_column(field, row)[0][row] += 1
+
+    def add_set(self, field, row):
+        try:
+            self.columns[field][1][row] += 1
+        except (KeyError, IndexError):
+            self.get_column(field, row)[1][row] += 1
+
+    def get_counts(self, field, row):
+        if (column := self.columns.get(field)) is None:
+            return 0, 0
+        return tuple(counts[row] if row < len(counts) else 0 for counts in column)
+
+    def __contains__(self, field):
+        return field in self.field_names or field in self.columns
+
+    def count_field_trackings(self, field_trackings, num_rows=None):
+        """
+        Adds the number of rows for each `(field, FieldTracker)` pair to `field_trackings`,
+        `None` standing for loaded fields that weren't used.
+        Only the first `num_rows` rows are counted when it's given.
+        """
+        if num_rows is None:
+            num_rows = self.num_rows
+        field_names = self.field_names
+        columns = self.columns
+
+        for field in field_names:
+            if field not in columns:
+                field_trackings[(field, None)] += num_rows
+
+        for field, column in columns.items():
+            self.get_column(field, num_rows - 1)
+            gets, sets = column
+            for (get, set), num_rows_with_counts in Counter(
+                zip(gets[:num_rows], sets[:num_rows])
+            ).items():
+                if get or set:
+                    field_trackings[
+                        (field, FieldTracker(get, set))
+                    ] += num_rows_with_counts
+                elif field in field_names:
+                    field_trackings[(field, None)] += num_rows_with_counts
+
+    def fold(self, num_rows, field_trackings):
+        """
+        Counts the first `num_rows` rows in `field_trackings` and drops them,
+        the following rows being shifted to the start of the columns.
+        """
+        self.count_field_trackings(field_trackings, num_rows)
+        for column in self.columns.values():
+            for counts in column:
+                del counts[:num_rows]
+        self.num_rows -= num_rows
+
+
+def count_row_gets(keys, counts, field_trackings=None):
+    """
+    Returns the number of rows for each `(key, FieldTracker)` pair
+    from the flat counters of `RowCounters`.
+    """
+    if field_trackings is None:
+        field_trackings = HashableCounter()
+    num_keys = len(keys)
+    for index, key in enumerate(keys):
+        for get, num_rows in Counter(counts[index::num_keys]).items():
+            field_trackings[(key, FieldTracker(get) if get else None)] += num_rows
+    return field_trackings
+
+
+def count_instance_trackings(field_counts):
+    """Reduces the counters returned by `QuerySetTracker.get_field_counts`."""
+    if field_counts is None:
+        return None
+
+    instance_trackings = []
+    for model, select_related_field, folded, field_counters, row_counts in field_counts:
+        field_trackings = HashableCounter(folded) if folded else HashableCounter()
+        for counters in field_counters:
+            counters.count_field_trackings(field_trackings)
+        for keys, counts in row_counts:
+            count_row_gets(keys, counts, field_trackings)
+        instance_trackings.append((model, select_related_field, field_trackings))
+    return frozenset(instance_trackings)
+
+
+def count_field_trackings(trackers, field_trackings=None):
+    if field_trackings is None:
+        field_trackings = HashableCounter()
+    for counters in dict.fromkeys(tracker.counters for tracker in trackers):
+        counters.count_field_trackings(field_trackings)
+    return field_trackings
+
+
+class InstanceTracker:
+    """Field access counters of a single row, stored in its query's `FieldCounters`."""
+
+    __slots__ = ("counters", "row")
+
+    def __init__(self, counters, row):
+        self.counters = counters
+        self.row = row
+
+    def add_get(self, field):
+        self.counters.add_get(field, self.row)
+
+    def add_set(self, field):
+        self.counters.add_set(field, self.row)
+
+    def __getitem__(self, field):
+        return FieldTracker(*self.counters.get_counts(field, self.row))
+
+    def __contains__(self, field):
+        return field in self.counters
+
+    def __getstate__(self):
+        return {
+            "values": {
+                field: self.counters.get_counts(field, self.row)
+                for field in (*self.counters.field_names, *self.counters.columns)
+            },
+            "field_names": tuple(self.counters.field_names),
+        }
+
+    def __setstate__(self, state):
+        self.counters = counters = FieldCounters(state["field_names"])
+        self.row = counters.new_row()
+        for field, (get, set) in state["values"].items():
+            if get or set:
+                column = counters.get_column(field, self.row)
+                column[0][self.row], column[1][self.row] = get, set
 
 
 class ModelInstanceTracker(InstanceTracker, metaclass=LazySlots):
@@ -187,17 +301,24 @@ class ModelInstanceTracker(InstanceTracker, metaclass=LazySlots):
             self.object = weak_reference(obj)
 
 
-new_model_instance_tracker = ModelInstanceTracker.fromkeys
-
-
 class RequestTracker:
+    # Number of requests that weren't retained, by request info.
+    discarded = Counter()
+    discarded_lock = threading.Lock()
+
     __slots__ = (
         "request_info",
+        "sample_rate",
         "started_at",
         "finished",
+        "retained",
+        "pending",
         "queries",
         "num_queries",
         "num_queries_saved",
+        "num_counted_queries",
+        "counted_queries_duration",
+        "lock",
     )
 
     def __init__(self, request):
@@ -207,51 +328,182 @@ class RequestTracker:
             "content_type": request.content_type,
             "query_string": request.META.get("QUERY_STRING", ""),
         }
+        self.sample_rate = request._sample_rate
         self.started_at = now()
         self.finished = False
+        self.retained = True
+        # With tail retention, trackers are kept here until the request finishes.
+        self.pending = [] if TAIL_RETENTION else None
         self.queries = HashableCounter()
         self.num_queries = self.num_queries_saved = 0
+        # Queries executed with the `COUNTS` tracking level.
+        self.num_counted_queries = self.counted_queries_duration = 0
+        # Counts are updated by the collector and by the threads the request's
+        # queries run in, which aren't limited to the request's thread.
+        self.lock = threading.Lock()
         Collector.add_request(self)
 
+    def query_started(self):
+        with self.lock:
+            self.num_queries += 1
+
     def add_query(self, query_id):
-        self.queries[query_id] += 1
-        self.num_queries_saved += 1
-        if self.ready:
+        with self.lock:
+            self.queries[query_id] += 1
+            self.num_queries_saved += 1
+            ready = self.ready
+
+        if ready:
             Collector.request_ready(self)
 
+    def count_query(self, query_id):
+        """Counts an occurrence of a query that wasn't tracked."""
+        with self.lock:
+            self.queries[query_id] += 1
+
+    def count_execution(self, duration):
+        with self.lock:
+            self.num_counted_queries += 1
+            self.counted_queries_duration += duration
+
+    def add_tracker(self, tracker):
+        # Trackers may be added from other threads while the request finishes.
+        with self.lock:
+            if (pending := self.pending) is not None:
+                pending.append(tracker)
+            elif self.retained:
+                Collector.add_tracker(tracker)
+
     def request_finished(self):
-        self.finished = True
-        if self.ready:
+        with self.lock:
+            if (pending := self.pending) is not None:
+                self.pending = None
+                self.retained = self.should_retain(pending)
+            # Set last: the collector flushes finished requests without the lock.
+            self.finished = True
+            ready = self.ready
+
+        if not self.retained:
+            with self.discarded_lock:
+                self.discarded[tuple(self.request_info.items())] += 1
+            Collector.request_discarded(self)
+            return
+
+        for tracker in pending or ():
+            Collector.add_tracker(tracker)
+
+        if ready:
             Collector.request_ready(self)
 
+    def should_retain(self, trackers):
+        """
+        Indicates if the full detail of a request should be kept:
+        slow requests, requests with many queries and requests with N+1 queries.
+        """
+        return (
+            self.num_queries + self.num_counted_queries >= NUM_QUERIES_THRESHOLD
+            or (now() - self.started_at).total_seconds() * 1000
+            >= SLOW_REQUEST_THRESHOLD
+            or any(tracker.has_n_plus_one() for tracker in trackers)
+        )
+
     @property
     def ready(self):
         return self.finished and self.num_queries == self.num_queries_saved
 
+    def get_saved_state(self):
+        """Returns what `save_states` needs to save the request, possibly in another process."""
+        return (
+            self.request_info,
+            self.started_at,
+            self.sample_rate,
+            self.num_counted_queries,
+            self.counted_queries_duration,
+            self.queries,
+        )
+
     @staticmethod
-    def save_trackers(trackers):
+    def save_states(states):
         get_or_create_request = RequestPromise.get_or_create
         get_or_create_query_group = QueryGroupPromise.get_or_create
 
         trackings = tuple(
             Tracking(
-                started_at=tracker.started_at,
-                request_id=get_or_create_request(**tracker.request_info),
-                query_group_id=get_or_create_query_group(queries=tracker.queries),
+                started_at=started_at,
+                sample_rate=sample_rate,
+                num_queries=num_counted_queries or None,
+                queries_duration=counted_queries_duration or None,
+                request_id=get_or_create_request(**request_info),
+                query_group_id=get_or_create_query_group(queries=queries),
             )
-            for tracker in trackers
+            for (
+                request_info,
+                started_at,
+                sample_rate,
+                num_counted_queries,
+                counted_queries_duration,
+                queries,
+            ) in states
         )
         RequestPromise.resolve()
         QueryGroupPromise.resolve()
         return len(Tracking.objects.bulk_create(trackings))
 
+    @classmethod
+    def save_trackers(cls, trackers, save_states=None):
+        """
+        Saves request trackers with `save_states`,
+        which defaults to saving them in the current process.
+        """
+        save_states = save_states or cls.save_states
+        return save_states([tracker.get_saved_state() for tracker in trackers])
+
+    @classmethod
+    def pop_discarded(cls):
+        with cls.discarded_lock:
+            discarded = cls.discarded.copy()
+            cls.discarded.clear()
+        return discarded
+
+    @classmethod
+    def save_discarded(cls, discarded=None):
+        if discarded is None:
+            if not cls.discarded:
+                return
+            discarded = cls.pop_discarded()
+
+        counted_at = now()
+        get_or_create_request = RequestPromise.get_or_create
+        pop_num_requests = discarded.pop
+
+        counts = tuple(
+            RequestCount(
+                counted_at=counted_at,
+                request_id=get_or_create_request(**dict(request_info)),
+                num_requests=pop_num_requests(request_info),
+            )
+            for request_info in tuple(discarded)
+        )
+        RequestPromise.resolve()
+        RequestCount.objects.bulk_create(counts)
+
 
 class DummyRequestTracker:
     queries = Counter()
+    lock = threading.Lock()
 
     @classmethod
     def add_query(cls, query_id):
-        cls.queries[query_id] += 1
+        with cls.lock:
+            cls.queries[query_id] += 1
+
+    count_query = add_query
+
+    @staticmethod
+    def count_execution(duration):
+        pass
+
+    add_tracker = Collector.add_tracker
 
     @lazy_attribute
     def query_group_id(cls):
@@ -274,12 +526,21 @@ class DummyRequestTracker:
         return pk
 
     @classmethod
-    def save_queries(cls):
-        if not (queries := cls.queries):
-            return
+    def pop_queries(cls):
+        with cls.lock:
+            num_occurrences = cls.queries.copy()
+            cls.queries.clear()
+        return num_occurrences
 
-        queries = set(queries)
-        pop_num_occurrences = cls.queries.pop
+    @classmethod
+    def save_queries(cls, num_occurrences=None):
+        if num_occurrences is None:
+            if not cls.queries:
+                return
+            num_occurrences = cls.pop_queries()
+
+        queries = set(num_occurrences)
+        pop_num_occurrences = num_occurrences.pop
         query_group_id = cls.query_group_id
 
         saved = QuerySetTracking.objects.filter(
@@ -303,90 +564,204 @@ class DummyRequestTracker:
             )
 
 
-class QuerySetTracker(dict):
-    constructors = {
-        "related_querysets": list,
-        "deferred_fields": lambda: defaultdict(set),
-        "instance_trackers": lambda: defaultdict(list),
-    }
+def get_model(instance):
+    """
+    Returns the model of an instance, which may have been switched to a tracking class,
+    without counting `__class__` as an attribute accessed.
+    """
+    return object.__getattribute__(instance, "__class__")
+
+
+def get_request_tracker():
+    if (request := get_request()) is not DUMMY_REQUEST:
+        return request._tracker
+    return DummyRequestTracker
+
+
+class CallSite:
+    """
+    Executions of querysets of the same shape from the same place in the code.
+
+    The first `ADAPTIVE_SAMPLING_THRESHOLD` executions of a call site are fully tracked.
+    After that, executions are only counted except for one every `interval` executions.
+    The interval doubles each time up to `ADAPTIVE_SAMPLING_MAX_INTERVAL`.
+    """
+
+    __slots__ = ("query_id", "num_tracked", "num_skipped", "interval")
+
+    call_sites = LRUCache(maxsize=4096)
+
+    def __init__(self):
+        self.query_id = None
+        self.num_tracked = self.num_skipped = 0
+        self.interval = 2
+
+    @classmethod
+    def get(cls, traceback, model, query_type, iterable_class=None):
+        # Keyed by the tuple itself, colliding hashes mustn't merge call sites.
+        key = traceback, model, query_type, iterable_class
+        if (call_site := cls.call_sites.get(key)) is None:
+            call_site = cls()
+            cls.call_sites.set(key, call_site)
+        return call_site
+
+    def should_track(self):
+        if self.query_id is None or self.num_tracked < ADAPTIVE_SAMPLING_THRESHOLD:
+            return True
+
+        self.num_skipped += 1
+        if self.num_skipped < self.interval:
+            return False
+
+        self.num_skipped = 0
+        self.interval = min(2 * self.interval, ADAPTIVE_SAMPLING_MAX_INTERVAL)
+        return True
+
+    def count_occurrence(self):
+        get_request_tracker().count_query(self.query_id)
+
+    def tracked(self, query_id):
+        self.query_id = query_id
+        self.num_tracked += 1
+
+
+class QuerySetTracker:
+    # Keyword arguments of `QueryPromise.get_or_create` that may be omitted.
+    optional_kwargs = tuple(
+        map(
+            sys.intern,
+            (
+                "depth",
+                "cache_hits",
+                "len_calls",
+                "exists_calls",
+                "contains_calls",
+                "field",
+                "iterable_class",
+                "instance_trackings",
+                "related_queryset_id",
+                "attributes_accessed",
+            ),
+        )
+    )
 
     __slots__ = (
         "__weakref__",
+        "sql",
+        "model",
+        "num_instances",
+        "query_type",
+        "traceback",
+        *optional_kwargs,
         "duration",
         "num_ready",
+        "sweep_cursor",
+        "row_counters",
+        "rows_ref",
+        "row_counts",
+        "row_chunks",
         "request_tracker",
+        "call_site",
         "is_related",
+        "flushed",
         "related_queryset",
+        "related_querysets",
+        "deferred_fields",
+        "instance_trackers",
+        "instance_refs",
+        "chunk_size",
+        "fold_at",
+        "folded_trackings",
         "_iter_done",
         "_result_cache_collected",
-        "constructed",
-        *constructors,
     )
 
-    def __getattr__(self, name):
-        if constructor := self.constructors.get(name):
-            value = constructor()
-            setattr(self, name, value)
-            self.constructed.add(name)
-            return value
-
-        raise AttributeError(name)
-
     def __init__(
         self,
         queryset,
         query_type,
         iterable_class=None,
         track_attributes_accessed=False,
+        *,
+        traceback=None,
+        call_site=None,
+        chunk_size=None,
     ):
-        super().__init__(
-            sql="",
-            num_instances=0,
-            model=queryset.model,
-            query_type=query_type,
-            traceback=get_traceback(),
+        self.sql = ""
+        self.model = queryset.model
+        self.num_instances = self.num_ready = self.sweep_cursor = 0
+        self.query_type = query_type
+        self.traceback = traceback if traceback is not None else get_traceback()
+        self.depth = self.cache_hits = self.field = None
+        self.len_calls = self.exists_calls = self.contains_calls = None
+        self.instance_trackings = self.related_queryset_id = None
+        self.iterable_class = iterable_class or None
+        self.attributes_accessed = (
+            HashableCounter() if track_attributes_accessed else None
         )
 
-        self.num_ready = 0
-        self.constructed = set()
-        self.is_related = False
+        self.row_counters = self.rows_ref = self.row_counts = self.row_chunks = None
+        self.related_querysets = self.deferred_fields = None
+        self.instance_trackers = self.instance_refs = None
+        # Instances streamed by `iterator()` are folded every `chunk_size` rows.
+        self.chunk_size = self.fold_at = chunk_size
+        self.folded_trackings = None
+        self.call_site = call_site
+        self.is_related = self.flushed = False
         self._iter_done = self._result_cache_collected = False
 
-        if iterable_class:
-            self["iterable_class"] = iterable_class
-
-        if track_attributes_accessed:
-            self["attributes_accessed"] = HashableCounter()
-
-        if (request := get_request()) is not DUMMY_REQUEST:
-            self.request_tracker = request._tracker
-            self.request_tracker.num_queries += 1
-        else:
-            self.request_tracker = DummyRequestTracker
+        self.request_tracker = get_request_tracker()
+        if self.request_tracker is not DummyRequestTracker:
+            self.request_tracker.query_started()
 
-        if (instance := queryset._hints.get("instance")) and (
-            instance_tracker := getattr(instance, "_tracker", None)
+        # Queries of instances whose tracker was flushed are tracked on their own.
+        if (
+            (instance := queryset._hints.get("instance"))
+            and (instance_tracker := getattr(instance, "_tracker", None))
+            and not (related_qs := instance_tracker.queryset).flushed
         ):
-            instance_tracker.queryset.add_related_queryset(self)
+            related_qs.add_related_queryset(self)
             if field := queryset._hints.get("field"):
-                self["field"] = type(instance), field
+                self.field = get_model(instance), field
 
         queryset._tracker = self
 
     def add_related_queryset(self, qs_tracker):
-        self.related_querysets.append(qs_tracker)
+        if (related_querysets := self.related_querysets) is None:
+            self.related_querysets = related_querysets = []
+        related_querysets.append(qs_tracker)
         qs_tracker.is_related = True
         qs_tracker.related_queryset = weak_reference(self)
-        qs_tracker["depth"] = self.get("depth", 0) + 1
+        qs_tracker.depth = (self.depth or 0) + 1
+
+    def has_n_plus_one(self):
+        """
+        Indicates if several related querysets were run
+        for the same field of this queryset's instances.
+        """
+        if (related_querysets := self.related_querysets) is None:
+            return False
+
+        fields = Counter(qs_tracker.field for qs_tracker in related_querysets)
+        return any(num_querysets > 1 for num_querysets in fields.values()) or any(
+            qs_tracker.has_n_plus_one() for qs_tracker in related_querysets
+        )
 
     def add_deferred_field(self, field, instance):
-        self.deferred_fields[field].add(instance)
+        if self.flushed:
+            return
+        if (deferred_fields := self.deferred_fields) is None:
+            self.deferred_fields = deferred_fields = defaultdict(set)
+        deferred_fields[field].add(instance)
 
     def track_instance(self, instance, model, field="", *, tracker=None):
-        self["num_instances"] += 1
+        self.num_instances += 1
         if tracker:
-            self.instance_trackers[(field, model)].append(tracker)
-            weakref_finalize(instance, self.instance_tracker_ready)
+            if (instance_trackers := self.instance_trackers) is None:
+                self.instance_trackers = instance_trackers = defaultdict(list)
+                self.instance_refs = []
+            instance_trackers[(field, model)].append(tracker)
+            self.instance_refs.append(weak_reference(instance))
         else:
             self.num_ready += 1
         return instance
@@ -411,51 +786,155 @@ class QuerySetTracker(dict):
 
             del tracker.related
 
+        if not field and (fold_at := self.fold_at) and self.num_instances >= fold_at:
+            self.fold()
+
         return instance
 
+    def fold(self):
+        """
+        Counts the field accesses of the collected instances of a streamed queryset
+        in `folded_trackings` and releases their trackers,
+        so that the memory used is bounded by the chunk size, not the number of rows.
+        """
+        self.fold_at = self.num_instances + self.chunk_size
+        self.sweep()
+        del self.instance_refs[: self.sweep_cursor]
+        self.sweep_cursor = 0
+
+        if (folded_trackings := self.folded_trackings) is None:
+            self.folded_trackings = folded_trackings = defaultdict(HashableCounter)
+
+        for key, trackers in self.instance_trackers.items():
+            num_collected = 0
+            for tracker in trackers:
+                if tracker.object() is not None:
+                    break
+                num_collected += 1
+
+            # Trackers sharing the same counters hold consecutive rows.
+            start = 0
+            while start < num_collected:
+                counters = trackers[start].counters
+                end = start + 1
+                while end < num_collected and trackers[end].counters is counters:
+                    end += 1
+                num_rows = end - start
+                if trackers[start].row != 0 or trackers[end - 1].row != num_rows - 1:
+                    break
+
+                counters.fold(num_rows, folded_trackings[key])
+                for tracker in trackers[end:]:
+                    if tracker.counters is counters:
+                        tracker.row -= num_rows
+                start = end
+
+            del trackers[:start]
+
+    def get_row_counters(self, keys):
+        # Rows returned by `values()` and `values_list()` all have the same keys.
+        if (row_counters := self.row_counters) is None or (
+            (chunk_size := self.chunk_size) and row_counters.num_rows == chunk_size
+        ):
+            if row_counters is not None:
+                self.fold_rows(row_counters)
+            self.row_counters = row_counters = RowCounters(keys)
+            self.row_counts = row_counters.keys, row_counters.counts
+        return row_counters
+
+    def fold_rows(self, row_counters):
+        """
+        Streamed rows get new counters every `chunk_size` rows. The counts of
+        the chunks whose rows were all collected are added to `folded_trackings`
+        and released, so that the memory used is bounded by the chunk size.
+        """
+        chunks = self.row_chunks or []
+        chunks.append((weak_reference(row_counters), row_counters.counts))
+
+        if (folded_trackings := self.folded_trackings) is None:
+            self.folded_trackings = folded_trackings = defaultdict(HashableCounter)
+
+        field_trackings = folded_trackings[("", self.model)]
+        keys = row_counters.keys
+        self.row_chunks = []
+        for chunk in chunks:
+            if chunk[0]() is None:
+                count_row_gets(keys, chunk[1], field_trackings)
+            else:
+                self.row_chunks.append(chunk)
+
     def track_dict(self, d, model):
-        tracker = new_instance_tracker(d)
-        return self.track_instance(TrackedDict(d, tracker), model, tracker=tracker)
+        self.num_instances += 1
+        return make_tracked_dict(d, self.get_row_counters(d))
 
     def track_sequence(self, seq, model):
-        tracker = new_instance_tracker(map(str, range(len(seq))))
-        return self.track_instance(
-            TrackedSequence(seq, tracker), model, tracker=tracker
+        self.num_instances += 1
+        return make_tracked_sequence(
+            seq, self.get_row_counters(map(str, range(len(seq))))
         )
 
+    def sweep(self):
+        """
+        Counts the tracked instances that were garbage collected.
+        Instances are mostly freed in the order they were returned,
+        so the sweep stops at the first live instance and resumes from it next time.
+        """
+        if (
+            (rows_ref := self.rows_ref) is not None
+            and rows_ref() is None
+            and not any(ref() is not None for ref, _ in self.row_chunks or ())
+        ):
+            # All rows returned by `values()` or `values_list()` were collected.
+            self.rows_ref = None
+            self.num_ready = self.num_instances
+
+        if (refs := self.instance_refs) is None:
+            return
+
+        cursor = start = self.sweep_cursor
+        num_refs = len(refs)
+        while cursor < num_refs and refs[cursor]() is None:
+            cursor += 1
+
+        self.sweep_cursor = cursor
+        self.num_ready += cursor - start
+
     @property
     def ready(self):
+        self.sweep()
         return (
-            self.num_ready == self["num_instances"]
+            self.num_ready == self.num_instances
             and self._iter_done
             and self._result_cache_collected
         )
 
-    def instance_tracker_ready(self):
-        self.num_ready += 1
-        if self.ready:
-            Collector.tracker_ready(self)
-
     def result_cache_collected(self):
         self._result_cache_collected = True
-        if self.ready:
-            Collector.tracker_ready(self)
+        # Readiness is checked by the collector, which alone sweeps trackers.
+        Collector.tracker_ready(self)
 
     def iter_done(self, queryset, duration):
         self.duration = duration
         self._iter_done = True
 
+        if (row_counters := self.row_counters) is not None:
+            # Only rows keep their counters alive from now on.
+            self.row_counters = None
+            self.rows_ref = weak_reference(row_counters)
+
         if not self.is_related:
-            Collector.add_tracker(self)
+            self.request_tracker.add_tracker(self)
         elif (
-            self["num_instances"] == 1
+            self.num_instances == 1
             and (related_qs := self.related_queryset())
-            and "deferred_fields" in related_qs.constructed
+            and (deferred_fields := related_qs.deferred_fields) is not None
         ):
-            deferred_fields = related_qs.deferred_fields
             instance = queryset._hints["instance"]
             db_instance = self.instance_trackers[("", queryset.model)][0].object()
-            if type(instance) is type(db_instance) and instance.pk == db_instance.pk:
+            if (
+                get_model(instance) is get_model(db_instance)
+                and instance.pk == db_instance.pk
+            ):
                 loaded_fields = tuple(
                     field for field in deferred_fields if field in db_instance.__dict__
                 )
@@ -463,49 +942,125 @@ class QuerySetTracker(dict):
                     len(loaded_fields) == 1
                     and instance in deferred_fields[loaded_fields[0]]
                 ):
-                    self["field"] = queryset.model, loaded_fields[0]
+                    self.field = queryset.model, loaded_fields[0]
                     deferred_fields[loaded_fields[0]].remove(instance)
 
-    def save(self):
-        if "instance_trackers" in self.constructed:
-            self["instance_trackings"] = frozenset(
+    def get_field_counts(self):
+        """
+        Returns the counters `count_instance_trackings` reduces into the instance
+        trackings of the query, as `(model, select_related_field, folded_trackings,
+        field_counters, row_counts)` tuples, without reducing them.
+        """
+        folded_trackings = self.folded_trackings or {}
+        if (instance_trackers := self.instance_trackers) is not None:
+            return [
                 (
                     model,
                     select_related_field,
-                    HashableCounter(
-                        chain.from_iterable(tracker.items() for tracker in trackers)
-                    ),
+                    folded_trackings.get((select_related_field, model)),
+                    tuple(dict.fromkeys(tracker.counters for tracker in trackers)),
+                    (),
                 )
                 for (
                     select_related_field,
                     model,
-                ), trackers in self.instance_trackers.items()
-            )
+                ), trackers in instance_trackers.items()
+            ]
+        elif (row_counts := self.row_counts) is not None:
+            keys, counts = row_counts
+            chunks = self.row_chunks or ()
+            return [
+                (
+                    self.model,
+                    "",
+                    folded_trackings.get(("", self.model)),
+                    (),
+                    (*((keys, chunk_counts) for _, chunk_counts in chunks), row_counts),
+                )
+            ]
+
+    def get_instance_trackings(self):
+        return count_instance_trackings(self.get_field_counts())
 
-        query_id = QueryPromise.get_or_create(**self)
-        QueryPromise.update_duration(query_id, self.duration)
+    def get_saved_state(self):
+        """
+        Returns what `save_states` needs to save the tracker, possibly in another process.
+        Field counters are only reduced by `save_states`.
+        """
+        return self.to_kwargs(), self.duration, self.get_field_counts()
+
+    @staticmethod
+    def save_states(states):
+        """Saves queries from the states of their trackers and returns their ids."""
+        get_or_create_query = QueryPromise.get_or_create
+        update_duration = QueryPromise.update_duration
+        query_ids = []
+
+        for kwargs, duration, field_counts in states:
+            if (
+                instance_trackings := count_instance_trackings(field_counts)
+            ) is not None:
+                kwargs["instance_trackings"] = instance_trackings
+            query_ids.append(query_id := get_or_create_query(**kwargs))
+            update_duration(query_id, duration)
+
+        QueryPromise.resolve()
+        return query_ids
 
-        if "related_querysets" in self.constructed:
-            for related_tracker in self.related_querysets:
-                related_tracker["related_queryset_id"] = query_id
+    def saved(self, query_id):
+        if self.call_site:
+            self.call_site.tracked(query_id)
+
+        if (related_querysets := self.related_querysets) is not None:
+            for related_tracker in related_querysets:
+                related_tracker.related_queryset_id = query_id
                 Collector.add_tracker(related_tracker)
 
         self.request_tracker.add_query(query_id)
 
-    @staticmethod
-    def save_trackers(trackers):
-        deque((tracker.save() for tracker in trackers), maxlen=0)
-        QueryPromise.resolve()
+        if self.flushed:
+            # Release what the instances still alive would otherwise retain.
+            self.related_querysets = self.deferred_fields = None
+            self.instance_trackers = self.instance_refs = self.folded_trackings = None
+            self.instance_trackings = None
+
+    @classmethod
+    def save_trackers(cls, trackers, save_states=None):
+        """
+        Saves queryset trackers with `save_states`,
+        which defaults to saving them in the current process.
+        """
+        save_states = save_states or cls.save_states
+        query_ids = save_states([tracker.get_saved_state() for tracker in trackers])
+        for tracker, query_id in zip(trackers, query_ids):
+            tracker.saved(query_id)
         return len(trackers)
 
-    def __hash__(self):
-        return id(self)
+    def to_kwargs(self):
+        """
+        Returns the keyword arguments of `QueryPromise.get_or_create`.
+        """
+        kwargs = {
+            "sql": self.sql,
+            "model": self.model,
+            "num_instances": self.num_instances,
+            "query_type": self.query_type,
+            "traceback": self.traceback,
+        }
+        for name in self.optional_kwargs:
+            if (value := getattr(self, name)) is not None:
+                kwargs[name] = value
+        return kwargs
 
     def __repr__(self):
-        return f"<QueryTracker {self['sql']}>"
+        return f"<QueryTracker {self.sql}>"
 
     def __getstate__(self):
-        return dict(self.items())
+        return self.to_kwargs()
 
     def __setstate__(self, state):
-        self.update(state)
+        for name in self.__slots__[1:]:
+            setattr(self, name, None)
+        self.is_related = self.flushed = False
+        for name, value in state.items():
+            setattr(self, name, value)
@@ -1,5 +1,7 @@
 from functools import wraps
 
+from dj_tracker.patching import patch
+
 
 class FieldDescriptor:
     __slots__ = ("descriptor", "attname")
@@ -10,7 +12,7 @@ class FieldDescriptor:
 
     def __get__(self, instance, cls):
         if (instance_tracker := getattr(instance, "_tracker", None)) is not None:
-            instance_tracker.get_field_tracker(self.attname).get += 1
+            instance_tracker.add_get(self.attname)
 
         return self.descriptor.__get__(instance, cls)
 
@@ -20,8 +22,10 @@ class DeferredAttributeDescriptor(FieldDescriptor):
 
     def __init__(self, descriptor, attname):
         super().__init__(descriptor, attname)
-        descriptor._check_parent_chain = self.wrap_check_parent_chain(
-            descriptor._check_parent_chain, attname
+        patch(
+            descriptor,
+            "_check_parent_chain",
+            self.wrap_check_parent_chain(descriptor._check_parent_chain, attname),
         )
 
     @staticmethod
@@ -43,7 +47,7 @@ class DeferredAttributeDescriptor(FieldDescriptor):
     def __set__(self, instance, value):
         instance.__dict__[self.attname] = value
         if (instance_tracker := getattr(instance, "_tracker", None)) is not None:
-            instance_tracker.get_field_tracker(self.attname).set += 1
+            instance_tracker.add_set(self.attname)
 
     def __delete__(self, instance):
         del instance.__dict__[self.attname]
@@ -55,7 +59,18 @@ class EditableFieldDescriptor(FieldDescriptor):
     def __set__(self, instance, value):
         self.descriptor.__set__(instance, value)
         if (instance_tracker := getattr(instance, "_tracker", None)) is not None:
-            instance_tracker.get_field_tracker(self.attname).set += 1
+            instance_tracker.add_set(self.attname)
+
+
+try:
+    # Compiled versions of the descriptors above.
+    from dj_tracker._field_descriptors import (  # noqa: F811
+        DeferredAttributeDescriptor,
+        EditableFieldDescriptor,
+        FieldDescriptor,
+    )
+except ImportError:  # pragma: no cover
+    pass
 
 
 class SingleRelationDescriptor(EditableFieldDescriptor):
@@ -64,7 +79,11 @@ class SingleRelationDescriptor(EditableFieldDescriptor):
     def __init__(self, descriptor, attname):
         super().__init__(descriptor, attname)
         if get_queryset := getattr(descriptor, "get_queryset", None):
-            descriptor.get_queryset = self.wrap_get_queryset(get_queryset, attname)
+            patch(
+                descriptor,
+                "get_queryset",
+                self.wrap_get_queryset(get_queryset, attname),
+            )
 
     @staticmethod
     def wrap_get_queryset(get_queryset, attname):
@@ -80,8 +99,13 @@ class MultipleRelationDescriptor(FieldDescriptor):
 
     def __init__(self, descriptor, attname):
         super().__init__(descriptor, attname)
-        descriptor.related_manager_cls._apply_rel_filters = self.wrap_apply_rel_filters(
-            descriptor.related_manager_cls._apply_rel_filters, attname
+        related_manager_cls = descriptor.related_manager_cls
+        patch(
+            related_manager_cls,
+            "_apply_rel_filters",
+            self.wrap_apply_rel_filters(
+                related_manager_cls._apply_rel_filters, attname
+            ),
         )
 
     @staticmethod
@@ -1,5 +1,10 @@
 # cython: c_string_type=str, c_string_encoding=default
 
+from cpython.dict cimport PyDict_Next
+from cpython.object cimport PyObject, PyObject_Hash
+from libc.stdint cimport int64_t, uint64_t
+from libc.string cimport memcpy
+
 from collections import Counter
 
 from dj_tracker.cache_utils import LazySlots
@@ -26,41 +31,86 @@ class HashableCounter(HashableMixin, Counter):
     lazy_slots = (hash_value,)
 
 
-cpdef int hash_string(str string):
-    # djb2: http://www.cse.yorku.ca/~oz/hash.html.
+cdef extern from "Python.h":
+    const char *PyUnicode_AsUTF8AndSize(object, Py_ssize_t*) except NULL
+
+
+cdef uint64_t murmur_hash_64a(const unsigned char *data, Py_ssize_t length, uint64_t seed):
+    # MurmurHash64A: https://github.com/aappleby/smhasher/blob/master/src/MurmurHash2.cpp.
     cdef:
-        size_t i, n = len(string)
-        unsigned long hash_value = 5381
-        const unsigned char *as_c_string = string
+        uint64_t m = 0xC6A4A7935BD1E995ULL
+        int r = 47
+        uint64_t h = seed ^ (<uint64_t>length * m)
+        uint64_t k
+        Py_ssize_t i, num_blocks = length // 8
+        const unsigned char *tail = data + num_blocks * 8
+        int remaining = length & 7
+
+    for i in range(num_blocks):
+        memcpy(&k, data + i * 8, 8)
+        k *= m
+        k ^= k >> r
+        k *= m
+        h ^= k
+        h *= m
+
+    if remaining:
+        for i in range(remaining):
+            h ^= <uint64_t>tail[i] << (8 * i)
+        h *= m
+
+    h ^= h >> r
+    h *= m
+    h ^= h >> r
+    return h
+
+
+cpdef int64_t hash_string(str string):
+    """
+    Returns a 64-bit hash of the UTF-8 encoding of `string`.
+    Unlike `hash`, the result doesn't change from one process to another.
+    """
+    cdef:
+        Py_ssize_t length
+        # The UTF-8 encoding is cached by the string.
+        const char *data = PyUnicode_AsUTF8AndSize(string, &length)
 
-    for i in range(n):
-        hash_value += (hash_value << 5) + as_c_string[i]
+    return <int64_t>murmur_hash_64a(<const unsigned char*>data, length, 0xE17A1465ULL)
 
-    return hash_value
 
+cdef inline uint64_t mix(uint64_t value):
+    # splitmix64 finalizer: https://prng.di.unimi.it/splitmix64.c.
+    value = (value ^ (value >> 30)) * 0xBF58476D1CE4E5B9ULL
+    value = (value ^ (value >> 27)) * 0x94D049BB133111EBULL
+    return value ^ (value >> 31)
 
-cdef int hash_list(list l):
-    # See section on list hashing:
-    # https://docs.python.org/3/faq/design.html#how-are-dictionaries-implemented-in-cpython.
+
+cdef Py_hash_t hash_list(list l):
+    # Each item is mixed into the hash of the items before it,
+    # so the result depends on their order and keeps all 64 bits.
     cdef:
-        size_t i, n = len(l)
-        unsigned long hash_value = 98767 - n * 555
+        Py_ssize_t i, n = len(l)
+        uint64_t hash_value = mix(n)
 
     for i in range(n):
-        hash_value += (hash(l[i]) % 9999999) * 1001 + i
+        hash_value = mix(hash_value ^ <uint64_t>PyObject_Hash(l[i]))
 
-    return hash_value
+    return <Py_hash_t>hash_value
 
 
-cdef int hash_counter(dict counter):
+cdef Py_hash_t hash_counter(dict counter):
+    # Items are mixed independently and summed, so the result doesn't depend on
+    # their order: keys don't need to be sorted (nor to be comparable).
     cdef:
-        size_t i, n = len(counter)
-        unsigned long value, hash_value = 98767 - n * 555
-        list keys = sorted(counter)
-
-    for i in range(n):
-        key = keys[i]
-        value = counter[key]
-        hash_value += (hash(key) % 9999999) * 1001 + value
-
-    return hash_value
+        PyObject *key
+        PyObject *value
+        Py_ssize_t pos = 0
+        Py_hash_t key_hash, value_hash
+        uint64_t hash_value = mix(len(counter))
+
+    while PyDict_Next(counter, &pos, &key, &value):
+        key_hash = PyObject_Hash(<object>key)
+        value_hash = PyObject_Hash(<object>value)
+        hash_value += mix(<uint64_t>key_hash ^ mix(<uint64_t>value_hash))
+
+    return <Py_hash_t>hash_value
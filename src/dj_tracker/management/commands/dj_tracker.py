@@ -0,0 +1,19 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from dj_tracker.constants import CONTROL_FILE
+
+
+class Command(BaseCommand):
+    help = "Pauses, resumes, uninstalls or starts tracking in running processes using CONTROL_FILE."
+
+    def add_arguments(self, parser):
+        parser.add_argument("action", choices=("pause", "resume", "uninstall", "start"))
+
+    def handle(self, *args, action, **options):
+        if not CONTROL_FILE:
+            raise CommandError("DJ_TRACKER['CONTROL_FILE'] must be set.")
+
+        with open(CONTROL_FILE, "w") as f:
+            f.write(action)
+
+        self.stdout.write(f"{action!r} written to {CONTROL_FILE}.")
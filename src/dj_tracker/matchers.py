@@ -0,0 +1,42 @@
+import re
+import sys
+
+
+def compile_alternatives(strings):
+    # An empty pattern would match everything, `(?!)` never matches.
+    return re.compile("|".join(map(re.escape, strings)) or r"(?!)")
+
+
+def compile_substrings(substrings):
+    """
+    Compiles `substrings` into a single pattern, so that finding any of them
+    in a string is one `search` call running in C rather than a Python loop.
+    The regex engine still tries the alternatives one by one at each position.
+    """
+    return compile_alternatives(sorted(substrings))
+
+
+class PathPrefixes:
+    """
+    Finds the first entry of `sys.path` a filename starts with.
+    The entries are compiled into a single pattern, compiled again when `sys.path` changes.
+    Changes are detected from the list's identity, length and end entries,
+    where entries are added and removed in practice, rather than by comparing
+    the whole list on each call.
+    """
+
+    __slots__ = ("paths", "version", "pattern")
+
+    def __init__(self):
+        self.paths = self.version = self.pattern = None
+
+    def match(self, filename):
+        paths = sys.path
+        version = len(paths), paths and paths[0], paths and paths[-1]
+        if paths is not self.paths or version != self.version:
+            self.paths, self.version = paths, version
+            # Alternatives are tried in order, like a scan of `sys.path`.
+            self.pattern = compile_alternatives(path for path in paths if path)
+
+        if match := self.pattern.match(filename):
+            return match.group()
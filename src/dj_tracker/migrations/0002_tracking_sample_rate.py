@@ -0,0 +1,15 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("dj_tracker", "0001_initial"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="tracking",
+            name="sample_rate",
+            field=models.FloatField(default=1),
+        ),
+    ]
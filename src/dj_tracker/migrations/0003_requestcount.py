@@ -0,0 +1,38 @@
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("dj_tracker", "0002_tracking_sample_rate"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="RequestCount",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("counted_at", models.DateTimeField()),
+                ("num_requests", models.PositiveIntegerField()),
+                (
+                    "request",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="counts",
+                        to="dj_tracker.request",
+                    ),
+                ),
+            ],
+            options={
+                "ordering": ("-counted_at",),
+            },
+        ),
+    ]
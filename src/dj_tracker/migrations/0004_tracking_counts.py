@@ -0,0 +1,20 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("dj_tracker", "0003_requestcount"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="tracking",
+            name="num_queries",
+            field=models.PositiveIntegerField(null=True),
+        ),
+        migrations.AddField(
+            model_name="tracking",
+            name="queries_duration",
+            field=models.PositiveBigIntegerField(null=True),
+        ),
+    ]
@@ -231,6 +231,20 @@ class RequestQuerySet(models.QuerySet):
     def annotate_num_trackings(self):
         return self.annotate(num_trackings=models.Count("trackings", distinct=True))
 
+    def annotate_estimated_num_requests(self):
+        # Each tracking stands for `1 / sample_rate` requests.
+        estimated_num_requests = (
+            Tracking.objects.filter(request_id=models.OuterRef("pk"))
+            .order_by()
+            .annotate(total=models.Func(1.0 / models.F("sample_rate"), function="Sum"))
+            .values("total")
+        )
+        return self.annotate(
+            estimated_num_requests=models.Subquery(
+                estimated_num_requests, output_field=models.FloatField()
+            )
+        )
+
     def annotate_n_plus_one(self):
         return self.annotate(
             n_plus_one=models.Exists(
@@ -265,6 +279,11 @@ class Request(Promisable):
 
 class Tracking(models.Model):
     started_at = models.DateTimeField()
+    # Fraction of requests that were tracked when this tracking was recorded.
+    sample_rate = models.FloatField(default=1)
+    # Number of queries and their total duration, for the `COUNTS` tracking level.
+    num_queries = models.PositiveIntegerField(null=True)
+    queries_duration = models.PositiveBigIntegerField(null=True)
     query_group = models.ForeignKey(
         QueryGroup, on_delete=models.CASCADE, related_name="trackings"
     )
@@ -274,3 +293,18 @@ class Tracking(models.Model):
 
     class Meta:
         ordering = ("-started_at",)
+
+
+class RequestCount(models.Model):
+    """
+    Number of requests that were tracked but not retained, see `TAIL_RETENTION`.
+    """
+
+    request = models.ForeignKey(
+        Request, on_delete=models.CASCADE, related_name="counts"
+    )
+    counted_at = models.DateTimeField()
+    num_requests = models.PositiveIntegerField()
+
+    class Meta:
+        ordering = ("-counted_at",)
@@ -0,0 +1,25 @@
+"""
+Reversible monkeypatching: every attribute set with `patch` can be restored with `unpatch_all`.
+"""
+
+_MISSING = object()
+_patches = []
+
+
+def patch(obj, name, value):
+    """
+    Sets the attribute `name` of `obj` to `value`,
+    keeping the original value so that it can be restored.
+    """
+    _patches.append((obj, name, vars(obj).get(name, _MISSING)))
+    setattr(obj, name, value)
+
+
+def unpatch_all():
+    """Restores all patched attributes, most recent first."""
+    while _patches:
+        obj, name, original = _patches.pop()
+        if original is _MISSING:
+            delattr(obj, name)
+        else:
+            setattr(obj, name, original)
@@ -1,3 +1,4 @@
+import threading
 from typing import Dict, FrozenSet, Hashable, Optional, Tuple
 
 from django.apps import apps
@@ -18,6 +19,10 @@ class Promise:
     # Promise class(es) this one depends on,
     # typically via foreign keys on the model it represents.
     deps = ()
+    # Names of the containers of objects created along with the promises.
+    pending = ()
+    # All promise classes.
+    classes = []
 
     __slots__ = ("cache_key", "creation_kwargs")
 
@@ -26,31 +31,57 @@ class Promise:
         cls.model = apps.get_model(
             "dj_tracker", cls.__name__[:-7]  # removesuffix("Promise")
         )
+        cls.cache_size = cache_size
+        cls.setup()
+        Promise.classes.append(cls)
+
+    @classmethod
+    def setup(cls):
+        """
+        Creates the promises to resolve, their cache, lock and `get_or_create`,
+        and empties the pending containers.
+        """
+        for name in cls.pending:
+            getattr(cls, name).clear()
+
         cls.to_resolve = to_resolve = {}
         cls.resolve_promise = to_resolve.pop
+        # Guards the cache and the promises to resolve, so that concurrent
+        # `get_or_create` and `resolve` calls don't create an object twice.
+        cls.lock = lock = threading.RLock()
 
         get_cache_key = cls.get_cache_key
         get_in_memory_key = cls.get_in_memory_key
         set_creation_kwargs = getattr(cls, "set_creation_kwargs", None)
 
-        cache = LRUCache(maxsize=cache_size)
+        cache = LRUCache(maxsize=cls.cache_size)
         cache_get = cache.get
         cache_set = cache.set
 
         def get_or_create(**kwargs):
             in_memory_key = get_in_memory_key(**kwargs)
-            if not (cache_key := cache_get(in_memory_key)):
-                if set_creation_kwargs:
-                    set_creation_kwargs(kwargs)
-                if (cache_key := get_cache_key(**kwargs)) not in to_resolve:
-                    to_resolve[cache_key] = cls(cache_key, kwargs)
+            with lock:
+                if not (cache_key := cache_get(in_memory_key)):
+                    if set_creation_kwargs:
+                        set_creation_kwargs(kwargs)
+                    if (cache_key := get_cache_key(**kwargs)) not in to_resolve:
+                        to_resolve[cache_key] = cls(cache_key, kwargs)
 
-                cache_set(in_memory_key, cache_key)
+                    cache_set(in_memory_key, cache_key)
 
             return cache_key
 
         cls.get_or_create = get_or_create
 
+    @classmethod
+    def after_fork(cls):
+        """
+        Runs in child processes: the parent's promises are resolved by the parent
+        and their locks may have been forked while held, all classes are set up again.
+        """
+        for promise_class in cls.classes:
+            promise_class.setup()
+
     @staticmethod
     def get_in_memory_key(**kwargs) -> Hashable:
         raise NotImplementedError
@@ -117,20 +148,21 @@ class Promise:
         Ideally, this should be called when a lot of promises need to be resolved,
         to benefit more from doing things in bulk.
         """
-        if not (to_resolve := cls.to_resolve):
+        if not cls.to_resolve:
             return
 
-        # Copy the current set of promises as other promises may be
-        # added to the `to_resolve` dict  while this method is running.
-        # Also, we need to make the copy *before* resolving dependencies,
-        # otherwise we may copy promises for which some deps weren't resolved.
-        to_resolve = to_resolve.copy()
-        for dep in cls.deps:
-            dep.resolve()
+        with cls.lock:
+            # Copy the current set of promises as other promises may be
+            # added to the `to_resolve` dict  while this method is running.
+            # Also, we need to make the copy *before* resolving dependencies,
+            # otherwise we may copy promises for which some deps weren't resolved.
+            to_resolve = cls.to_resolve.copy()
+            for dep in cls.deps:
+                dep.resolve()
 
-        cls.resolve_existing(to_resolve)
-        if to_resolve:
-            cls.resolve_new(to_resolve)
+            cls.resolve_existing(to_resolve)
+            if to_resolve:
+                cls.resolve_new(to_resolve)
 
 
 class ModelPromise(Promise):
@@ -262,6 +294,7 @@ class TracebackPromise(Promise):
     deps = (SourceCodePromise,)
 
     stack_entries = []
+    pending = ("stack_entries",)
 
     __slots__ = "stack"
 
@@ -304,10 +337,11 @@ class TracebackPromise(Promise):
 
     @classmethod
     def resolve(cls):
-        super().resolve()
-        if stack_entries := cls.stack_entries:
-            StackEntry.objects.bulk_create(stack_entries)
-            stack_entries.clear()
+        with cls.lock:
+            super().resolve()
+            if stack_entries := cls.stack_entries:
+                StackEntry.objects.bulk_create(stack_entries)
+                stack_entries.clear()
 
 
 class FieldTrackingPromise(Promise):
@@ -341,6 +375,7 @@ class InstanceTrackingPromise(Promise):
     deps = (FieldTrackingPromise,)
 
     trackings = []
+    pending = ("trackings",)
 
     __slots__ = "field_trackings"
 
@@ -404,10 +439,11 @@ class InstanceTrackingPromise(Promise):
 
     @classmethod
     def resolve(cls):
-        super().resolve()
-        if trackings := cls.trackings:
-            InstanceFieldTracking.objects.bulk_create(trackings)
-            trackings.clear()
+        with cls.lock:
+            super().resolve()
+            if trackings := cls.trackings:
+                InstanceFieldTracking.objects.bulk_create(trackings)
+                trackings.clear()
 
 
 class QueryPromise(Promise):
@@ -415,6 +451,7 @@ class QueryPromise(Promise):
 
     trackings = []
     durations = {}
+    pending = ("trackings", "durations")
 
     __slots__ = "instance_trackings"
 
@@ -553,20 +590,22 @@ class QueryPromise(Promise):
 
     @classmethod
     def resolve(cls):
-        super().resolve()
-        if trackings := cls.trackings:
-            cls.model.instance_trackings.through.objects.bulk_create(trackings)
-            trackings.clear()
+        with cls.lock:
+            super().resolve()
+            if trackings := cls.trackings:
+                cls.model.instance_trackings.through.objects.bulk_create(trackings)
+                trackings.clear()
 
-        if cls.durations:
-            cls.update_durations()
+            if cls.durations:
+                cls.update_durations()
 
     @classmethod
     def update_duration(cls, cache_key, duration):
-        if not (prev_duration := cls.durations.get(cache_key)):
-            cls.durations[cache_key] = duration
-        else:
-            cls.durations[cache_key] = (prev_duration + duration) / 2
+        with cls.lock:
+            if not (prev_duration := cls.durations.get(cache_key)):
+                cls.durations[cache_key] = duration
+            else:
+                cls.durations[cache_key] = (prev_duration + duration) / 2
 
     @classmethod
     def update_durations(cls):
@@ -587,6 +626,7 @@ class QueryPromise(Promise):
 
 class QueryGroupPromise(Promise, cache_size=128):
     trackings = []
+    pending = ("trackings",)
 
     __slots__ = "queries"
 
@@ -618,7 +658,8 @@ class QueryGroupPromise(Promise, cache_size=128):
 
     @classmethod
     def resolve(cls):
-        super().resolve()
-        if trackings := cls.trackings:
-            QuerySetTracking.objects.bulk_create(trackings)
-            trackings.clear()
+        with cls.lock:
+            super().resolve()
+            if trackings := cls.trackings:
+                QuerySetTracking.objects.bulk_create(trackings)
+                trackings.clear()
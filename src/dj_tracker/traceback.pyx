@@ -1,6 +1,7 @@
 cimport cython
 from cpython.object cimport PyObject
 from cpython.pystate cimport PyFrameObject
+from libc.stdint cimport uint64_t, uintptr_t
 
 import os
 import sys
@@ -12,6 +13,7 @@ from dj_tracker.cache_utils cimport LRUCache
 
 from dj_tracker.constants import IGNORED_MODULES
 from dj_tracker.hash_utils import HashableList, hash_string
+from dj_tracker.matchers import PathPrefixes, compile_substrings
 from dj_tracker.promise import SourceFilePromise
 
 
@@ -24,12 +26,13 @@ cdef extern from "Python.h":
         PyObject *co_name
 
     PyFrameObject *PyEval_GetFrame()
-    int PyFrame_GetLineNumber(PyFrameObject*)
+    int PyCode_Addr2Line(PyCodeObject*, int)
 
 
 cdef extern from "pythoncapi_compat.h":
     PyFrameObject *PyFrame_GetBack(PyFrameObject*)
     PyCodeObject *PyFrame_GetCode(PyFrameObject*)
+    int PyFrame_GetLasti(PyFrameObject*)
     PyObject *PyFrame_GetGlobals(PyFrameObject*)
     PyObject *PyFrame_GetVar(PyFrameObject*, PyObject*) except NULL
 
@@ -45,7 +48,7 @@ cdef class TracebackEntry:
         bint ignore
         bint is_render
 
-        int hash_value
+        Py_hash_t hash_value
 
     def __init__(self, str filename, str rel_path, bint ignore, int lineno, str func):
         self.filename = filename
@@ -85,7 +88,12 @@ cdef class TracebackEntry:
         raise AttributeError(name)
 
 
-cdef tuple get_file_info(str filename, PyFrameObject *frame, dict cache = {}):
+cdef:
+    object match_sys_path = PathPrefixes().match
+    object find_ignored_module = compile_substrings(IGNORED_MODULES).search
+
+
+cdef tuple get_file_info(str filename, dict f_globals, dict cache = {}):
     """Retrieves the relative path for a filename and indicates if it should be ignored."""
     cdef:
         str rel_path
@@ -94,14 +102,10 @@ cdef tuple get_file_info(str filename, PyFrameObject *frame, dict cache = {}):
     try:
         return cache[filename]
     except KeyError:
-        try:
-            module_dir = next(path for path in sys.path if filename.startswith(path))
-        except StopIteration:
+        if (module_dir := match_sys_path(filename)) is None:
             # The following logic is inspired from:
             # https://github.com/scoutapp/scout_apm_python/blob/master/src/scout_apm/core/backtrace.py#L29
-            f_globals = PyFrame_GetGlobals(frame)
-            module = (<dict>f_globals).get("__name__", "")
-            Py_DECREF(f_globals)
+            module = f_globals.get("__name__", "")
 
             if (root_module := sys.modules.get(module.split(".", 1)[0])) is not None:
                 if module_path := root_module.__file__:
@@ -113,7 +117,7 @@ cdef tuple get_file_info(str filename, PyFrameObject *frame, dict cache = {}):
                 module_dir = os.getcwd()
 
         rel_path = os.path.relpath(filename, module_dir)
-        ignore = any(module in filename for module in IGNORED_MODULES)
+        ignore = find_ignored_module(filename) is not None
         cache[filename] = file_info = rel_path, ignore
         return file_info
 
@@ -121,37 +125,244 @@ cdef tuple get_file_info(str filename, PyFrameObject *frame, dict cache = {}):
 cdef inline TracebackEntry get_entry(
     str filename,
     object lineno,
-    PyFrameObject *frame,
-    PyCodeObject *code = NULL,
+    dict f_globals,
+    str func = "",
     LRUCache cache = LRUCache(maxsize=512)
 ):
     cdef TracebackEntry entry
-    cache_key = filename, lineno
+    # A comprehension and its enclosing function can share a line.
+    cache_key = filename, lineno, func
 
     if (entry := cache.get(cache_key)) is None:
         entry = TracebackEntry(
             filename,
-            *get_file_info(filename, frame),
+            *get_file_info(filename, f_globals),
             lineno,
-            <object>code.co_name if code else "",
+            func,
         )
         cache.set(cache_key, entry)
 
     return entry
 
 
-cpdef tuple get_traceback():
+cdef class RawTraceback:
+    """
+    The code objects and last instructions of the frames of a traceback,
+    captured while the query runs and only resolved into `(stack, template_info)`
+    when it's first unpacked, usually by the `Collector`.
+    """
+
+    cdef:
+        tuple frames
+        object template_node
+        dict template_globals
+        Py_hash_t hash_value
+        readonly tuple resolved
+
+    def __init__(self, tuple frames, template_node, template_globals, Py_hash_t hash_value):
+        self.frames = frames
+        self.template_node = template_node
+        self.template_globals = template_globals
+        self.hash_value = hash_value
+        self.resolved = None
+
+    def __hash__(self):
+        return self.hash_value
+
+    def __eq__(self, other):
+        # Tracebacks evicted from the cache are captured again for the same frames.
+        cdef:
+            RawTraceback traceback
+            tuple frames
+
+        if self is other:
+            return True
+        if not isinstance(other, RawTraceback):
+            return NotImplemented
+
+        traceback = <RawTraceback>other
+        if (
+            self.hash_value != traceback.hash_value
+            or self.template_node is not traceback.template_node
+            or len(self.frames) != len(traceback.frames)
+        ):
+            return False
+
+        # Code objects and globals by identity, last instructions by value.
+        frames = traceback.frames
+        for i, item in enumerate(self.frames):
+            if item is not frames[i] and (i % 3 != 1 or item != frames[i]):
+                return False
+        return True
+
+    def __len__(self):
+        return 2
+
+    def __iter__(self):
+        return iter(self.resolve())
+
+    def __getitem__(self, index):
+        return self.resolve()[index]
+
+    def __reduce__(self):
+        # Only line numbers are computed here: entries are resolved when unpickled,
+        # by the process saving the traceback (see `COLLECTOR_PROCESS`).
+        cdef PyCodeObject *code
+
+        if self.resolved is not None:
+            return tuple, (self.resolved,)
+
+        frames = self.frames
+        frames_info = []
+        for i in range(0, len(frames), 3):
+            code = <PyCodeObject*>frames[i]
+            frames_info.append(
+                (
+                    <object>code.co_filename,
+                    PyCode_Addr2Line(code, frames[i + 1]),
+                    (<dict>frames[i + 2]).get("__name__", ""),
+                    <object>code.co_name,
+                )
+            )
+
+        if (node := self.template_node) is not None:
+            template_info = (
+                node.origin.name,
+                node.token.lineno,
+                self.template_globals.get("__name__", ""),
+            )
+        else:
+            template_info = None
+
+        return resolve_traceback, (frames_info, template_info)
+
+    cpdef tuple resolve(self):
+        cdef:
+            PyCodeObject *code
+            list entries = []
+
+        if self.resolved is not None:
+            return self.resolved
+
+        frames = self.frames
+        for i in range(0, len(frames), 3):
+            code = <PyCodeObject*>frames[i]
+            entries.append(
+                get_entry(
+                    <object>code.co_filename,
+                    PyCode_Addr2Line(code, frames[i + 1]),
+                    frames[i + 2],
+                    <object>code.co_name,
+                )
+            )
+
+        if (node := self.template_node) is not None:
+            template_info = get_entry(
+                node.origin.name, node.token.lineno, self.template_globals
+            )
+        else:
+            template_info = None
+
+        self.resolved = trim_entries(entries), template_info
+        return self.resolved
+
+
+cdef list trim_entries(list entries):
+    """Drops the ignored entries above and below the entries of the project."""
     cdef:
-        PyFrameObject *frame
-        PyFrameObject *last_frame
-        PyCodeObject *code
-        PyObject *node
         TracebackEntry entry
-        str self_var = "self"
         bint top_entries_found = False
         int num_bottom_entries = 0
         list stack = <list>HashableList()
-        object template_info = None
+
+    for entry in entries:
+        if entry.ignore:
+            if top_entries_found:
+                stack.append(entry)
+                num_bottom_entries += 1
+        else:
+            if num_bottom_entries:
+                num_bottom_entries = 0
+            elif not top_entries_found:
+                top_entries_found = True
+
+            stack.append(entry)
+
+    if num_bottom_entries:
+        stack[-num_bottom_entries:] = []
+
+    return stack
+
+
+def resolve_traceback(list frames_info, tuple template_info):
+    """Resolves the frames of a pickled `RawTraceback` into `(stack, template_info)`."""
+    stack = trim_entries(
+        [
+            get_entry(filename, lineno, {"__name__": module}, func)
+            for filename, lineno, module, func in frames_info
+        ]
+    )
+    if template_info is not None:
+        filename, lineno, module = template_info
+        template_info = get_entry(filename, lineno, {"__name__": module})
+
+    return stack, template_info
+
+
+cdef:
+    # FNV-1a parameters.
+    uint64_t FNV_OFFSET_BASIS = 14695981039346656037ULL
+    uint64_t FNV_PRIME = 1099511628211ULL
+
+    str render_name = sys.intern("render")
+    str self_var = "self"
+    LRUCache tracebacks = LRUCache(maxsize=1024)
+
+
+cdef list get_frames():
+    """
+    Returns the code object, last instruction and globals of each of the caller's frames,
+    flattened to avoid allocating a container per frame.
+    """
+    cdef:
+        PyFrameObject *frame
+        PyFrameObject *last_frame
+        PyCodeObject *code
+        PyObject *f_globals
+        list frames = []
+
+    last_frame = PyEval_GetFrame()
+    Py_INCREF(<PyObject*>last_frame)
+
+    while frame := PyFrame_GetBack(last_frame):
+        Py_DECREF(<PyObject*>last_frame)
+        last_frame = frame
+
+        code = PyFrame_GetCode(frame)
+        f_globals = PyFrame_GetGlobals(frame)
+        frames += (<object>code, PyFrame_GetLasti(frame), <object>f_globals)
+        Py_DECREF(f_globals)
+        Py_DECREF(<PyObject*>code)
+
+    Py_DECREF(<PyObject*>last_frame)
+    return frames
+
+
+cpdef object get_traceback():
+    """
+    Returns the traceback of the caller as a `RawTraceback`, created once per chain of frames.
+    Chains are identified by the code objects and last instructions of their frames,
+    along with the template node being rendered when there's one.
+    """
+    cdef:
+        PyFrameObject *frame
+        PyFrameObject *last_frame
+        PyCodeObject *code
+        PyObject *node
+        PyObject *f_globals
+        uint64_t fingerprint = FNV_OFFSET_BASIS
+        object template_node = None
+        object template_globals = None
 
     if not (last_frame := PyEval_GetFrame()):
         return (), None
@@ -163,10 +374,10 @@ cpdef tuple get_traceback():
         last_frame = frame
 
         code = PyFrame_GetCode(frame)
-        entry = get_entry(<object>code.co_filename, PyFrame_GetLineNumber(frame), frame, code)
-        Py_DECREF(<PyObject*>code)
+        fingerprint = (fingerprint ^ <uintptr_t>code) * FNV_PRIME
+        fingerprint = (fingerprint ^ <uint64_t>PyFrame_GetLasti(frame)) * FNV_PRIME
 
-        if template_info is None and entry.is_render:
+        if template_node is None and code.co_name == <PyObject*>render_name:
             # This logic is inspired from:
             # https://github.com/jazzband/django-debug-toolbar/blob/main/debug_toolbar/utils.py#L123-L127
             try:
@@ -174,26 +385,27 @@ cpdef tuple get_traceback():
             except NameError:
                 pass
             else:
-                node_obj = <object>node
-                if isinstance(node_obj, Node):
-                    template_info = get_entry(node_obj.origin.name, node_obj.token.lineno, frame)
+                if isinstance(<object>node, Node):
+                    template_node = <object>node
+                    f_globals = PyFrame_GetGlobals(frame)
+                    template_globals = <object>f_globals
+                    Py_DECREF(f_globals)
+                    fingerprint = (fingerprint ^ <uintptr_t>node) * FNV_PRIME
                 Py_DECREF(node)
 
-        if entry.ignore:
-            if top_entries_found:
-                stack.append(entry)
-                num_bottom_entries += 1
-        else:
-            if num_bottom_entries:
-                num_bottom_entries = 0
-            elif not top_entries_found:
-                top_entries_found = True
-
-            stack.append(entry)
+        Py_DECREF(<PyObject*>code)
 
     Py_DECREF(<PyObject*>last_frame)
 
-    if num_bottom_entries:
-        stack[-num_bottom_entries:] = []
-
-    return stack, template_info
+    # Cached tracebacks keep their code objects and template node alive,
+    # so their addresses can't be reused by other ones.
+    if (
+        traceback := tracebacks.get(fingerprint)
+    ) is not None and (<RawTraceback>traceback).template_node is template_node:
+        return traceback
+
+    traceback = RawTraceback(
+        tuple(get_frames()), template_node, template_globals, <Py_hash_t>fingerprint
+    )
+    tracebacks.set(fingerprint, traceback)
+    return traceback
@@ -0,0 +1,144 @@
+from cpython cimport array
+from cpython.dict cimport PyDict_GetItemWithError, PyDict_Update
+from cpython.object cimport PyObject
+from libc.string cimport memset
+
+import array
+
+
+cdef array.array COUNTS_TEMPLATE = array.array("L")
+
+
+cdef class RowCounters:
+    """
+    Get counters of the rows returned by `values()` or `values_list()`,
+    stored in a flat C array of `num_rows * num_keys` counters.
+    Keys are computed once per queryset.
+
+    Rows hold a reference to their counters, the queryset tracker only holds
+    a weak reference to know when all rows were garbage collected.
+    """
+
+    cdef readonly tuple keys
+    cdef readonly array.array counts
+    cdef readonly Py_ssize_t num_rows
+    cdef dict indexes
+    cdef Py_ssize_t num_keys
+    cdef object __weakref__
+
+    def __init__(self, keys):
+        self.keys = tuple(keys)
+        self.indexes = {key: index for index, key in enumerate(self.keys)}
+        self.num_keys = len(self.keys)
+        self.counts = array.clone(COUNTS_TEMPLATE, 0, zero=False)
+        self.num_rows = 0
+
+    cdef Py_ssize_t new_row(self) except -1:
+        cdef Py_ssize_t row = self.num_rows
+        array.resize_smart(self.counts, (row + 1) * self.num_keys)
+        memset(
+            &self.counts.data.as_ulongs[row * self.num_keys],
+            0,
+            self.num_keys * sizeof(unsigned long),
+        )
+        self.num_rows = row + 1
+        return row
+
+    cdef inline void add_get(self, Py_ssize_t row, Py_ssize_t index) noexcept:
+        self.counts.data.as_ulongs[row * self.num_keys + index] += 1
+
+    cdef void add_key_get(self, Py_ssize_t row, object key):
+        # Keys added after the row was returned aren't tracked.
+        if (index := self.indexes.get(key)) is not None:
+            self.add_get(row, index)
+
+    cdef void add_row_gets(self, Py_ssize_t row) noexcept:
+        cdef Py_ssize_t index
+        for index in range(self.num_keys):
+            self.add_get(row, index)
+
+    def get_count(self, Py_ssize_t row, key):
+        return self.counts[row * self.num_keys + self.indexes[key]]
+
+
+cdef class TrackedDict(dict):
+    """
+    A row returned by `values()`, counting the keys read with `[]` and `get`.
+    Reading `items()` or `values()` counts as reading every key.
+    """
+
+    cdef readonly RowCounters counters
+    cdef readonly Py_ssize_t row
+
+    def __getitem__(self, key):
+        cdef PyObject *value = PyDict_GetItemWithError(self, key)
+        if value is NULL:
+            raise KeyError(key)
+
+        self.counters.add_key_get(self.row, key)
+        return <object>value
+
+    def get(self, key, default=None):
+        cdef PyObject *value = PyDict_GetItemWithError(self, key)
+        if value is NULL:
+            return default
+
+        self.counters.add_key_get(self.row, key)
+        return <object>value
+
+    def items(self):
+        self.counters.add_row_gets(self.row)
+        return dict.items(self)
+
+    def values(self):
+        self.counters.add_row_gets(self.row)
+        return dict.values(self)
+
+    def __reduce__(self):
+        return dict, (dict(self),)
+
+
+cpdef TrackedDict make_tracked_dict(dict d, RowCounters counters):
+    cdef TrackedDict row = TrackedDict.__new__(TrackedDict)
+    PyDict_Update(row, d)
+    row.counters = counters
+    row.row = counters.new_row()
+    return row
+
+
+class TrackedSequence(tuple):
+    """
+    A row returned by `values_list()`, counting the indexes read.
+    Iterating or unpacking it counts as reading every index.
+
+    `tuple` subclasses can't have C attributes,
+    so the counters and the row index are stored in the instance `__dict__`.
+    """
+
+    def __getitem__(self, index):
+        cdef:
+            RowCounters counters = self.counters
+            Py_ssize_t row = self.row, i
+
+        value = tuple.__getitem__(self, index)
+        if type(index) is slice:
+            for i in range(*index.indices(len(self))):
+                counters.add_get(row, i)
+        else:
+            i = index
+            counters.add_get(row, i if i >= 0 else i + len(self))
+        return value
+
+    def __iter__(self):
+        (<RowCounters>self.counters).add_row_gets(self.row)
+        return tuple.__iter__(self)
+
+    def __reduce__(self):
+        return tuple, (tuple.__getitem__(self, slice(None)),)
+
+
+cpdef make_tracked_sequence(tuple seq, RowCounters counters):
+    row = TrackedSequence(seq)
+    row.counters = counters
+    row.row = counters.new_row()
+    return row
@@ -1,50 +1,171 @@
+import os
+import signal
 import threading
+from concurrent.futures import ThreadPoolExecutor
 from functools import lru_cache, partial, wraps
-from time import perf_counter_ns
-
-from django.core import signals
+from itertools import repeat
+from random import random
+from time import perf_counter_ns, sleep
+from types import MethodType
+from weakref import ref as weak_reference
+
+from asgiref.sync import sync_to_async
+from django.core import signals, signing
 from django.core.handlers import asgi, wsgi
 from django.db import connection
 from django.db.models import query
 from django.utils.functional import cached_property
 
+from dj_tracker.cache_utils import LRUCache
 from dj_tracker.collector import Collector
 from dj_tracker.constants import (
+    ADAPTIVE_SAMPLING_THRESHOLD,
+    COLLECTION_INTERVAL,
+    CONTROL_FILE,
     DUMMY_REQUEST,
     EXTRA_DESCRIPTORS,
     IGNORED_PATHS,
-    TRACK_ATTRIBUTES_ACCESSED,
+    LAZY_INSTRUMENTATION,
+    ON_DEMAND_TOKEN_MAX_AGE,
+    ON_DEMAND_TRACKING,
+    PATCH_THREAD_POOL_EXECUTOR,
+    PATHS_CACHE_SIZE,
+    SAMPLE_RATE,
+    SAMPLE_RATES,
     TRACKED_MODELS,
+    TRACKING_LEVEL,
+    TrackingLevel,
+)
+from dj_tracker.context import (
+    get_caller_traceback,
+    get_request,
+    is_untracked,
+    reset_caller_traceback,
+    reset_untracked,
+    set_caller_traceback,
+    set_request,
+    set_untracked,
+    submit_with_context,
 )
-from dj_tracker.context import get_request, set_request
 from dj_tracker.datastructures import (
+    CallSite,
+    FieldCounters,
     QuerySetTracker,
     RequestTracker,
     TrackedResultCache,
-    new_model_instance_tracker,
+    get_request_tracker,
 )
 from dj_tracker.field_descriptors import DESCRIPTORS_MAP
+from dj_tracker.logging import logger
+from dj_tracker.matchers import compile_substrings
 from dj_tracker.models import QueryType
+from dj_tracker.patching import patch, unpatch_all
+from dj_tracker.traceback import get_traceback
 
 _started = False
+_paused = False
 _lock = threading.Lock()
+# Serializes the creation of request trackers by threads sharing a request.
+_tracker_lock = threading.Lock()
+# Models whose `from_db` and field descriptors are wrapped.
+_instrumented = set()
+_control_file_mtime = None
+# Polls `CONTROL_FILE`, keeps running after `uninstall`.
+_watcher = None
+
+COUNTS = TrackingLevel.COUNTS
+QUERIES = TrackingLevel.QUERIES
+INSTANCES = TrackingLevel.INSTANCES
+ATTRIBUTES = TrackingLevel.ATTRIBUTES
 
 stop = Collector.stop
 
 
+# Setter of `object.__class__`, used to switch instances from/to tracking classes.
+set_class = object.__dict__["__class__"].__set__
+
+
+def make_tracking_class(model):
+    """
+    Returns a subclass of `model` counting the attributes accessed on its instances.
+    Only instances loaded from the database are switched to it when attributes are tracked,
+    the model class and other instances are left untouched.
+    """
+    get_attr = model.__getattribute__
+    tracker_attr = "_tracker"
+
+    def __getattribute__(instance, attr):
+        value = get_attr(instance, attr)
+        if attr != tracker_attr:
+            try:
+                instance_tracker = get_attr(instance, tracker_attr)
+            except AttributeError:
+                pass
+            else:
+                if (
+                    (qs_tracker := getattr(instance_tracker, "queryset", None))
+                    and attr not in instance_tracker
+                    and (attributes_accessed := qs_tracker.attributes_accessed)
+                    is not None
+                ):
+                    attributes_accessed[attr] += 1
+
+        return value
+
+    # `type.__new__` is used to bypass `ModelBase.__new__` which would register a new model.
+    return type.__new__(
+        type(model),
+        model.__name__,
+        (model,),
+        {
+            "__slots__": (),
+            "__module__": model.__module__,
+            "__qualname__": model.__qualname__,
+            "__getattribute__": __getattribute__,
+            # Keep `instance.__class__` returning the model, e.g for signals senders.
+            "__class__": property(lambda instance: model, set_class),
+        },
+    )
+
+
 class FromDBDescriptor:
-    __slots__ = ("model", "__func__")
+    __slots__ = ("model", "__func__", "tracking_class", "field_counters")
 
     def __init__(self, model):
         self.model = model
         # model.from_db is a classmethod, so we store the actual function.
         # This will keep inheritance rules.
         self.__func__ = model.from_db.__func__
+        self.tracking_class = make_tracking_class(model)
+        # Queries on the model may interleave (nested iterations, prefetches, threads).
+        self.field_counters = LRUCache(maxsize=16)
+
+    def __get__(self, instance, cls):
+        # Subclasses that aren't instrumented themselves (e.g proxies or children
+        # of a tracked model that aren't tracked) get their original `from_db`.
+        if cls is self.model:
+            return self
+        return MethodType(self.__func__, cls)
 
     def __call__(self, db, field_names, values):
         instance = self.__func__(self.model, db, field_names, values)
-        # TODO: Consider adding the `_tracker` attribute to the instance's `_state`.
-        instance._tracker = new_model_instance_tracker(field_names)
+        if (level := get_request()._tracking_level) >= INSTANCES and not is_untracked():
+            # Instances loaded by the same query share the same `field_names` list,
+            # and the same columnar counters. Cached lists are kept alive,
+            # so their ids can't be reused by other queries. Counters are only
+            # kept alive by the trackers of their rows: they're released with the query.
+            if (cached := self.field_counters.get(id(field_names))) is None or (
+                counters := cached[1]()
+            ) is None:
+                counters = FieldCounters(field_names)
+                self.field_counters.set(
+                    id(field_names), (field_names, weak_reference(counters))
+                )
+
+            # TODO: Consider adding the `_tracker` attribute to the instance's `_state`.
+            instance._tracker = counters.new_model_instance_tracker()
+            if level >= ATTRIBUTES and type(instance) is self.model:
+                set_class(instance, self.tracking_class)
         return instance
 
 
@@ -56,72 +177,226 @@ class ResultCacheDescriptor:
         if (result_cache := queryset.__dict__["_result_cache"]) is not None and (
             qs_tracker := getattr(queryset, "_tracker", None)
         ):
-            qs_tracker["cache_hits"] += 1
+            qs_tracker.cache_hits += 1
 
         return result_cache
 
     def __set__(self, queryset, value):
         if value is not None and (qs_tracker := getattr(queryset, "_tracker", None)):
-            qs_tracker["cache_hits"] = 0
+            qs_tracker.cache_hits = 0
             value = TrackedResultCache(value, qs_tracker)
 
         queryset.__dict__["_result_cache"] = value
 
 
 def execute_wrapper(execute, sql, params, many, context, *, qs_tracker):
-    qs_tracker["sql"] = sql
+    qs_tracker.sql = sql
     return execute(sql, params, many, context)
 
 
+def get_call_site(traceback, model, query_type, iterable_class=None):
+    if ADAPTIVE_SAMPLING_THRESHOLD:
+        return CallSite.get(traceback, model, query_type, iterable_class)
+
+
+def get_async_traceback(model):
+    """
+    Returns the traceback of an async caller about to query `model`, if tracked.
+    It's captured on the event loop: once the query runs in a `sync_to_async`
+    thread, the caller's frames are no longer on the stack.
+    """
+    if model in TRACKED_MODELS and get_request()._tracking_level >= QUERIES:
+        return get_traceback()
+
+
+def iterate_timed(iterator, on_done):
+    """
+    Yields the items of `iterator`, then calls `on_done` with the time spent producing them.
+    Async iterables are consumed in chunks by `sync_to_async` calls and the event loop
+    runs other tasks in between, so only the time spent in the iterator is counted.
+    """
+    duration = 0
+    started_at = perf_counter_ns()
+    for item in iterator:
+        duration += perf_counter_ns() - started_at
+        yield item
+        started_at = perf_counter_ns()
+
+    on_done(duration + perf_counter_ns() - started_at)
+
+
+def iterate_untracked(iterator):
+    """
+    Yields the items of `iterator` without tracking the instances they're built from.
+    Only the building of each item runs untracked, not the code consuming it.
+    """
+    next_item = iterator.__next__
+    while True:
+        token = set_untracked(True)
+        try:
+            item = next_item()
+        except StopIteration:
+            return
+        finally:
+            reset_untracked(token)
+        yield item
+
+
 def patch_queryset_method(method, query_type):
     @wraps(method)
     def wrapper(queryset):
         if (
-            queryset._result_cache is None
-            and queryset.model in TRACKED_MODELS
-            and not get_request()._ignore_path
+            queryset._result_cache is not None
+            or queryset.model not in TRACKED_MODELS
+            or not (level := get_request()._tracking_level)
         ):
-            qs_tracker = QuerySetTracker(queryset, query_type)
+            return method(queryset)
 
-            with connection.execute_wrapper(
-                partial(execute_wrapper, qs_tracker=qs_tracker)
-            ):
-                started_at = perf_counter_ns()
-                result = method(queryset)
-                duration = perf_counter_ns() - started_at
+        if level == COUNTS:
+            started_at = perf_counter_ns()
+            result = method(queryset)
+            get_request_tracker().count_execution(perf_counter_ns() - started_at)
+            return result
 
-            qs_tracker.iter_done(queryset, duration)
-            qs_tracker.result_cache_collected()
-        else:
+        traceback = get_caller_traceback() or get_traceback()
+        call_site = get_call_site(traceback, queryset.model, query_type)
+        if call_site and not call_site.should_track():
+            call_site.count_occurrence()
+            return method(queryset)
+
+        qs_tracker = QuerySetTracker(
+            queryset, query_type, traceback=traceback, call_site=call_site
+        )
+
+        with connection.execute_wrapper(
+            partial(execute_wrapper, qs_tracker=qs_tracker)
+        ):
+            started_at = perf_counter_ns()
             result = method(queryset)
+            duration = perf_counter_ns() - started_at
 
+        qs_tracker.iter_done(queryset, duration)
+        qs_tracker.result_cache_collected()
         return result
 
     return wrapper
 
 
-def track_instances(Iterable, track_attributes_accessed, instance_tracker):
+def patch_async_method(method):
+    @wraps(method)
+    async def wrapper(queryset, *args, **kwargs):
+        if (traceback := get_async_traceback(queryset.model)) is None:
+            return await method(queryset, *args, **kwargs)
+
+        token = set_caller_traceback(traceback)
+        try:
+            return await method(queryset, *args, **kwargs)
+        finally:
+            reset_caller_traceback(token)
+
+    return wrapper
+
+
+def patch_aiter(aiter):
+    @wraps(aiter)
+    def wrapper(queryset):
+        if (traceback := get_async_traceback(queryset.model)) is None:
+            return aiter(queryset)
+
+        async def generator():
+            token = set_caller_traceback(traceback)
+            try:
+                await sync_to_async(queryset._fetch_all)()
+            finally:
+                reset_caller_traceback(token)
+
+            for obj in queryset._result_cache:
+                yield obj
+
+        return generator()
+
+    return wrapper
+
+
+def patch_async_iterable():
+    aiter = query.BaseIterable.__aiter__
+
+    @wraps(aiter)
+    def __aiter__(self):
+        # The first chunk starts `__iter__` in a `sync_to_async` thread.
+        self._async_traceback = get_async_traceback(self.queryset.model)
+        return aiter(self)
+
+    patch(query.BaseIterable, "__aiter__", __aiter__)
+
+
+def track_instances(Iterable, instance_tracker):
     assert not hasattr(Iterable, "__patched")
     iterate = Iterable.__iter__
     query_type = QueryType.SELECT
+    is_model_iterable = instance_tracker == "track_model_instance"
 
     @wraps(iterate)
     def __iter__(self):
         qs = self.queryset
         model = qs.model
 
-        if model not in TRACKED_MODELS or get_request()._ignore_path:
+        if model not in TRACKED_MODELS or not (level := get_request()._tracking_level):
+            yield from iterate(self)
+            return
+
+        is_async = "_async_traceback" in (attrs := self.__dict__)
+        if level == COUNTS:
+            if is_async:
+                yield from iterate_timed(
+                    iterate(self), get_request_tracker().count_execution
+                )
+                return
+
+            started_at = perf_counter_ns()
             yield from iterate(self)
+            get_request_tracker().count_execution(perf_counter_ns() - started_at)
+            return
+
+        if LAZY_INSTRUMENTATION and model not in _instrumented:
+            instrument(model)
+
+        iterable_class = self.__class__
+        traceback = (
+            attrs.get("_async_traceback") or get_caller_traceback() or get_traceback()
+        )
+        call_site = get_call_site(traceback, model, query_type, iterable_class)
+        if call_site and not call_site.should_track():
+            call_site.count_occurrence()
+            if is_model_iterable:
+                yield from iterate_untracked(iterate(self))
+            else:
+                yield from iterate(self)
             return
 
         qs_tracker = QuerySetTracker(
-            qs, query_type, self.__class__, track_attributes_accessed
+            qs,
+            query_type,
+            iterable_class,
+            is_model_iterable and level >= ATTRIBUTES,
+            traceback=traceback,
+            call_site=call_site,
+            chunk_size=self.chunk_size if self.chunked_fetch else None,
+        )
+        track_instance = getattr(
+            qs_tracker, instance_tracker if level >= INSTANCES else "track_instance"
         )
-        track_instance = getattr(qs_tracker, instance_tracker)
 
         with connection.execute_wrapper(
             partial(execute_wrapper, qs_tracker=qs_tracker)
         ):
+            if is_async:
+                yield from iterate_timed(
+                    map(track_instance, iterate(self), repeat(model)),
+                    partial(qs_tracker.iter_done, qs),
+                )
+                return
+
             started_at = perf_counter_ns()
             for obj in iterate(self):
                 yield track_instance(obj, model)
@@ -129,18 +404,21 @@ def track_instances(Iterable, track_attributes_accessed, instance_tracker):
 
         qs_tracker.iter_done(qs, duration)
 
-    Iterable.__iter__ = __iter__
+    patch(Iterable, "__iter__", __iter__)
 
 
 def patch_iterables():
-    for Iterable, track_attributes_accessed, instance_tracker in (
-        (query.ModelIterable, TRACK_ATTRIBUTES_ACCESSED, "track_model_instance"),
-        (query.ValuesIterable, False, "track_dict"),
-        (query.ValuesListIterable, False, "track_sequence"),
-        (query.FlatValuesListIterable, False, "track_instance"),
+    for Iterable, instance_tracker in (
+        (query.ModelIterable, "track_model_instance"),
+        (query.ValuesIterable, "track_dict"),
+        (query.ValuesListIterable, "track_sequence"),
+        (query.FlatValuesListIterable, "track_instance"),
     ):
-        track_instances(Iterable, track_attributes_accessed, instance_tracker)
-        Iterable.__patched = True
+        track_instances(Iterable, instance_tracker)
+        patch(Iterable, "__patched", True)
+
+    if hasattr(query.BaseIterable, "__aiter__"):
+        patch_async_iterable()
 
 
 def patch_iterator(iterate):
@@ -153,28 +431,66 @@ def patch_iterator(iterate):
     return wrapper
 
 
+def patch_aiterator(aiterate):
+    @wraps(aiterate)
+    async def wrapper(queryset, *args, **kwargs):
+        try:
+            async for obj in aiterate(queryset, *args, **kwargs):
+                yield obj
+        finally:
+            if qs_tracker := getattr(queryset, "_tracker", None):
+                qs_tracker.result_cache_collected()
+
+    return wrapper
+
+
 def contains_patch(queryset, obj):
     queryset._fetch_all()
     return obj in queryset._result_cache
 
 
+ASYNC_METHODS = (
+    "acontains",
+    "acount",
+    "aearliest",
+    "aexists",
+    "afirst",
+    "aget",
+    "aget_or_create",
+    "ain_bulk",
+    "alast",
+    "alatest",
+    "aupdate_or_create",
+)
+
+
 def patch_queryset():
     QuerySet = query.QuerySet
     assert not hasattr(QuerySet, "__patched")
 
-    QuerySet.exists = patch_queryset_method(QuerySet.exists, QueryType.EXISTS)
-    QuerySet.count = patch_queryset_method(QuerySet.count, QueryType.COUNT)
-    QuerySet._iterator = patch_iterator(QuerySet._iterator)
-    QuerySet._result_cache = ResultCacheDescriptor()
-    QuerySet.__contains__ = contains_patch
-    QuerySet.__patched = True
+    patch(QuerySet, "exists", patch_queryset_method(QuerySet.exists, QueryType.EXISTS))
+    patch(QuerySet, "count", patch_queryset_method(QuerySet.count, QueryType.COUNT))
+    patch(QuerySet, "_iterator", patch_iterator(QuerySet._iterator))
+    patch(QuerySet, "_result_cache", ResultCacheDescriptor())
+    patch(QuerySet, "__contains__", contains_patch)
+
+    # Async methods run their sync counterparts in `sync_to_async` threads.
+    if hasattr(QuerySet, "__aiter__"):
+        patch(QuerySet, "__aiter__", patch_aiter(QuerySet.__aiter__))
+        patch(QuerySet, "aiterator", patch_aiterator(QuerySet.aiterator))
+
+    for name in ASYNC_METHODS:
+        if method := getattr(QuerySet, name, None):
+            patch(QuerySet, name, patch_async_method(method))
+
+    patch(QuerySet, "__patched", True)
 
 
 def wrap_local_setter(local_setter, field, related_model):
     def wrapper(from_obj, obj):
         local_setter(from_obj, obj)
-        if obj is not None:
-            from_obj._tracker.add_related_instance(obj, field, related_model)
+        if obj is not None and (tracker := getattr(from_obj, "_tracker", None)):
+            tracker.add_related_instance(obj, field, related_model)
 
     return wrapper
 
@@ -185,105 +501,336 @@ def patch_rel_populator():
     @wraps(init)
     def wrapper(self, klass_info, *args):
         if (model := klass_info["model"]) in TRACKED_MODELS:
+            if LAZY_INSTRUMENTATION and model not in _instrumented:
+                instrument(model)
             klass_info["local_setter"] = wrap_local_setter(
                 klass_info["local_setter"], klass_info["field"].name, model
             )
 
         init(self, klass_info, *args)
 
-    query.RelatedPopulator.__init__ = wrapper
+    patch(query.RelatedPopulator, "__init__", wrapper)
 
 
-def patch_requests():
-    @lru_cache
-    def ignore_path(path):
-        return any(component in path for component in IGNORED_PATHS)
+TOKEN_HEADER = "HTTP_X_DJ_TRACKER"
+TOKEN_COOKIE = "dj_tracker"
+TOKEN_SALT = "dj_tracker.tracker"
+
+
+find_ignored_path = compile_substrings(IGNORED_PATHS).search
+
 
+@lru_cache(maxsize=PATHS_CACHE_SIZE)
+def ignore_path(path):
+    return find_ignored_path(path) is not None
+
+
+@lru_cache(maxsize=PATHS_CACHE_SIZE)
+def get_sample_rate(path):
+    """
+    Returns the fraction of requests to `path` that should be tracked.
+    Ignored paths have a sample rate of 0.
+    """
+    if ignore_path(path):
+        return 0
+
+    return next(
+        (rate for component, rate in SAMPLE_RATES.items() if component in path),
+        SAMPLE_RATE,
+    )
+
+
+def make_tracking_token(level=ATTRIBUTES):
+    """
+    Returns a signed token enabling tracking for requests carrying it,
+    either in the `X-DJ-Tracker` header or in the `dj_tracker` cookie.
+    """
+    return signing.dumps(int(TrackingLevel(level)), salt=TOKEN_SALT)
+
+
+def get_requested_level(request):
+    """Returns the tracking level requested by a valid tracking token, if any."""
+    if not (
+        token := request.META.get(TOKEN_HEADER) or request.COOKIES.get(TOKEN_COOKIE)
+    ):
+        return
+
+    try:
+        level = signing.loads(token, salt=TOKEN_SALT, max_age=ON_DEMAND_TOKEN_MAX_AGE)
+    except signing.BadSignature:
+        return
+
+    try:
+        return TrackingLevel(level)
+    except ValueError:
+        # Signed with a level that doesn't exist (e.g by another version).
+        return
+
+
+def get_tracking_level(request):
+    if _paused:
+        return TrackingLevel.OFF
+
+    path = request.path
+    request._sample_rate = sample_rate = get_sample_rate(path)
+    if sample_rate >= 1 or random() < sample_rate:
+        level = TRACKING_LEVEL
+    else:
+        level = TrackingLevel.OFF
+
+    if (
+        ON_DEMAND_TRACKING
+        and not ignore_path(path)
+        and (requested_level := get_requested_level(request)) is not None
+        and requested_level > level
+    ):
+        request._sample_rate = 1
+        level = requested_level
+
+    return level
+
+
+def patch_requests():
     def patch_init(init):
         @wraps(init)
         def wrapper(request, *args):
             init(request, *args)
-            request._ignore_path = ignore_path(request.path)
+            request._tracking_level = get_tracking_level(request)
             set_request(request)
 
         return wrapper
 
+    def finish_request():
+        if tracker := get_request().__dict__.get("_tracker"):
+            tracker.request_finished()
+
+        set_request(DUMMY_REQUEST)
+
     def patch_send(send):
         @wraps(send)
         def wrapper(sender, **named):
             try:
                 return send(sender, **named)
             finally:
-                if tracker := get_request().__dict__.get("_tracker"):
-                    tracker.request_finished()
+                finish_request()
+
+        return wrapper
 
-                set_request(DUMMY_REQUEST)
+    def patch_asend(asend):
+        @wraps(asend)
+        async def wrapper(sender, **named):
+            try:
+                return await asend(sender, **named)
+            finally:
+                finish_request()
 
         return wrapper
 
     @cached_property
     def get_tracker(request):
-        return RequestTracker(request)
+        # Worker threads sharing the request may access it for the first time together,
+        # the tracker created first is the one stored by `cached_property`.
+        with _tracker_lock:
+            if (tracker := request.__dict__.get("_tracker")) is None:
+                request.__dict__["_tracker"] = tracker = RequestTracker(request)
+        return tracker
 
-    # Patch `__init__`.
-    wsgi.WSGIRequest.__init__ = patch_init(wsgi.WSGIRequest.__init__)
-    asgi.ASGIRequest.__init__ = patch_init(asgi.ASGIRequest.__init__)
-
-    # Patch `request_finished` signal.
-    signals.request_finished.send = patch_send(signals.request_finished.send)
+    for Request in (wsgi.WSGIRequest, asgi.ASGIRequest):
+        # Patch `__init__`.
+        patch(Request, "__init__", patch_init(Request.__init__))
 
-    # Add cached_property `_tracker` to requests classes.
-    wsgi.WSGIRequest._tracker = asgi.ASGIRequest._tracker = get_tracker
-    get_tracker.__set_name__(wsgi.WSGIRequest, "_tracker")
-    get_tracker.__set_name__(asgi.ASGIRequest, "_tracker")
+        # Add cached_property `_tracker` to requests classes.
+        patch(Request, "_tracker", get_tracker)
+        get_tracker.__set_name__(Request, "_tracker")
 
+    # Patch `request_finished` signal.
+    patch(signals.request_finished, "send", patch_send(signals.request_finished.send))
+    # Sent by the ASGI handler when the request is cancelled.
+    if asend := getattr(signals.request_finished, "asend", None):
+        patch(signals.request_finished, "asend", patch_asend(asend))
+
+
+def instrument_model(model):
+    """Wraps `from_db` and the field descriptors of `model`."""
+    descriptors = {**DESCRIPTORS_MAP, **EXTRA_DESCRIPTORS}
+    patch(model, "from_db", FromDBDescriptor(model))
+    for attname, attr in tuple(model.__dict__.items()):
+        if Descriptor := descriptors.get(type(attr).__name__):
+            patch(model, attname, Descriptor(attr, attname))
+    _instrumented.add(model)
+
+
+def get_model_family(model):
+    """
+    Returns `model` with its tracked parents and children,
+    which share the field descriptors defined on the parents.
+    """
+    family = set(model.__mro__)
+    children = model.__subclasses__()
+    while children:
+        family.add(child := children.pop())
+        children.extend(child.__subclasses__())
+    return family.intersection(TRACKED_MODELS)
+
+
+def instrument(model):
+    """
+    Instruments `model` along with its family, with `LAZY_INSTRUMENTATION`
+    this is done the first time one of its querysets is tracked.
+    """
+    with _lock:
+        if not _started:
+            return
 
-def patch_getattr():
-    get_attr = object.__getattribute__
-    tracker_attr = "_tracker"
-
-    @wraps(get_attr)
-    def wrapper(instance, attr):
-        value = get_attr(instance, attr)
-        if attr != tracker_attr:
-            try:
-                instance_tracker = get_attr(instance, tracker_attr)
-            except AttributeError:
-                pass
-            else:
-                if (
-                    qs_tracker := getattr(instance_tracker, "queryset", None)
-                ) and attr not in instance_tracker:
-                    qs_tracker["attributes_accessed"][attr] += 1
-
-        return value
-
-    return wrapper
+        for related_model in get_model_family(model):
+            if related_model not in _instrumented:
+                instrument_model(related_model)
 
 
 def start():
-    global _started
+    global _started, _control_file_mtime
 
     with _lock:
         if _started:
             return
 
+        if CONTROL_FILE:
+            start_watcher()
+            # Processes starting after an action was written follow it.
+            if (_control_file_mtime := get_control_file_mtime()) is not None:
+                action = read_control_file()
+            else:
+                action = None
+            if action == "uninstall":
+                return
+            if action == "pause":
+                pause()
+            elif action in ("start", "resume"):
+                resume()
+
         patch_queryset()
         patch_iterables()
         patch_rel_populator()
         patch_requests()
+        if PATCH_THREAD_POOL_EXECUTOR:
+            patch(ThreadPoolExecutor, "submit", submit_with_context)
 
-        descriptors = {**DESCRIPTORS_MAP, **EXTRA_DESCRIPTORS}
-        for model in TRACKED_MODELS:
-            model.from_db = FromDBDescriptor(model)
-            for attname, attr in model.__dict__.items():
-                if Descriptor := descriptors.get(type(attr).__name__):
-                    setattr(model, attname, Descriptor(attr, attname))
-
-        if TRACK_ATTRIBUTES_ACCESSED:
-            patched_get_attr = patch_getattr()
+        if not LAZY_INSTRUMENTATION:
             for model in TRACKED_MODELS:
-                model.__getattribute__ = patched_get_attr
+                instrument_model(model)
 
         Collector.start()
         _started = True
+
+
+def uninstall():
+    """
+    Restores all patched objects and stops the collector.
+    Tracking can be installed again with `start`.
+    """
+    global _started
+
+    with _lock:
+        if not _started:
+            return
+
+        unpatch_all()
+        _instrumented.clear()
+        Collector.stop()
+        _started = False
+
+
+def pause():
+    """Stops tracking new requests, patches are kept in place."""
+    global _paused
+
+    _paused = True
+    DUMMY_REQUEST._tracking_level = TrackingLevel.OFF
+
+
+def resume():
+    global _paused
+
+    _paused = False
+    DUMMY_REQUEST._tracking_level = TRACKING_LEVEL
+
+
+ACTIONS = {"start": start, "pause": pause, "resume": resume, "uninstall": uninstall}
+
+
+def run_action(action):
+    """
+    Runs one of `ACTIONS` in a separate thread, as `uninstall`
+    waits for the collector and mustn't run inside it or a signal handler.
+    """
+    thread = threading.Thread(target=ACTIONS[action], daemon=True)
+    thread.start()
+    return thread
+
+
+def install_signal_handler(signum, action):
+    """Runs `action` when the process receives the signal `signum`."""
+    signal.signal(signum, lambda signum, frame: run_action(action))
+
+
+def get_control_file_mtime():
+    try:
+        return os.stat(CONTROL_FILE).st_mtime_ns
+    except FileNotFoundError:
+        return None
+
+
+def read_control_file():
+    with open(CONTROL_FILE) as f:
+        return f.read().strip()
+
+
+def check_control_file():
+    """
+    Runs the action written in `CONTROL_FILE` (see the `dj_tracker` management command),
+    if the file changed since the last check.
+    """
+    global _control_file_mtime
+
+    if (mtime := get_control_file_mtime()) == _control_file_mtime:
+        return
+
+    _control_file_mtime = mtime
+    if mtime is None:
+        return
+
+    if (action := read_control_file()) in ACTIONS:
+        return run_action(action)
+
+    logger.warning(f"Unknown action {action!r} in {CONTROL_FILE}")
+
+
+def watch_control_file():
+    while True:
+        sleep(COLLECTION_INTERVAL)
+        check_control_file()
+
+
+def start_watcher():
+    global _watcher
+
+    if _watcher is None:
+        _watcher = threading.Thread(target=watch_control_file, daemon=True)
+        _watcher.start()
+
+
+def _after_fork():
+    global _lock, _tracker_lock, _watcher
+
+    # `uninstall` may have been running in another thread of the parent,
+    # and request threads creating their tracker.
+    _lock = threading.Lock()
+    _tracker_lock = threading.Lock()
+    # The parent's watcher doesn't survive `fork()`.
+    if _watcher is not None:
+        _watcher = None
+        start_watcher()
+
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_after_fork)
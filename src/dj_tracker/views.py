@@ -144,6 +144,7 @@ class RequestsView(ListView):
         return (
             Request.objects.select_related("path")
             .annotate_num_trackings()
+            .annotate_estimated_num_requests()
             .annotate_latest_occurrence()
         )
 
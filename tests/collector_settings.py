@@ -0,0 +1,11 @@
+import os
+
+from tests.settings import *  # noqa: F401,F403
+from tests.settings import DATABASES
+
+# Settings of the collector processes spawned by the tests,
+# which can't use the in-memory test databases.
+DATABASES = {
+    alias: {**database, "NAME": os.environ["DJ_TRACKER_TEST_DB"]}
+    for alias, database in DATABASES.items()
+}
@@ -0,0 +1,23 @@
+# Generated by Django 5.1 on 2026-10-17 04:02
+
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("tests", "0001_initial"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="Venue",
+            fields=[],
+            options={
+                "proxy": True,
+                "indexes": [],
+                "constraints": [],
+            },
+            bases=("tests.place",),
+        ),
+    ]
@@ -48,6 +48,11 @@ class Place(models.Model):
     address = models.CharField(max_length=80)
 
 
+class Venue(Place):
+    class Meta:
+        proxy = True
+
+
 class Pizzeria(models.Model):
     serves_pizza = models.BooleanField(default=True)
 
@@ -1,13 +1,57 @@
+import asyncio
+import gc
+import importlib.util
+import json
+import multiprocessing
+import os
 import pickle
 import random
+import signal
+import sqlite3
+import sys
+import tempfile
+import threading
+import time
 import unittest
+import weakref
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import closing
 from operator import attrgetter
+from unittest import mock
 
 from django import VERSION as DJANGO_VERSION
-from django.test import TestCase
+from django.conf import settings
+from django.contrib.auth.models import Group
+from django.core import signals, signing
+from django.core.exceptions import ImproperlyConfigured
+from django.core.management import CommandError, call_command
+from django.db import connections
+from django.db.models.query import QuerySet
+from django.test import AsyncRequestFactory, RequestFactory, TestCase
 from django.urls import reverse
 
-from dj_tracker.datastructures import QuerySetTracker, TrackedDict, TrackedSequence
+from dj_tracker import collector, constants, field_descriptors, tracker
+from dj_tracker.collector import Collector
+from dj_tracker.collector_process import CollectorProcess, serve
+from dj_tracker.constants import DUMMY_REQUEST, TrackingLevel
+from dj_tracker.context import ContextThreadPoolExecutor, get_request, with_context
+from dj_tracker.datastructures import (
+    CallSite,
+    DummyRequestTracker,
+    FieldCounters,
+    FieldTracker,
+    QuerySetTracker,
+    RequestTracker,
+    count_field_trackings,
+    count_instance_trackings,
+    count_row_gets,
+)
+from dj_tracker.hash_utils import HashableCounter, HashableList, hash_string
+from dj_tracker.matchers import PathPrefixes, compile_substrings
+from dj_tracker.models import Query, QuerySetTracking, QueryType
+from dj_tracker.promise import QueryPromise, SQLPromise
+from dj_tracker.traceback import get_traceback
+from dj_tracker.tracked_rows import TrackedDict, TrackedSequence
 from tests.factories import (
     AuthorFactory,
     BookFactory,
@@ -16,7 +60,16 @@ from tests.factories import (
     TastyRestaurantFactory,
     UserFactory,
 )
-from tests.models import Author, Book, Category, Comment, TastyRestaurant, User
+from tests.models import (
+    Author,
+    Book,
+    Category,
+    Comment,
+    Place,
+    TastyRestaurant,
+    User,
+    Venue,
+)
 
 get_instance_tracker = get_queryset_tracker = attrgetter("_tracker")
 
@@ -57,7 +110,7 @@ class TestAttributeTracker(TestCase):
         self.assertEqual(tracker["title"].set, 1)
         related_qs_tracker = tracker.queryset.related_querysets[0]
         self.assertIs(related_qs_tracker.related_queryset(), tracker.queryset)
-        self.assertEqual(related_qs_tracker["field"], (Book, "title"))
+        self.assertEqual(related_qs_tracker.field, (Book, "title"))
 
 
 class TestForwardManyToOneTracker(TestCase):
@@ -324,7 +377,7 @@ class TestSelectRelated(TestCase):
         )
 
         # All related instances are tracked by one qs tracker.
-        self.assertEqual(get_instance_tracker(comment).queryset["num_instances"], 3)
+        self.assertEqual(get_instance_tracker(comment).queryset.num_instances, 3)
 
 
 class TestCacheHits(TestCase):
@@ -337,7 +390,7 @@ class TestCacheHits(TestCase):
                 for _ in range(n):
                     self.assertEqual(len(authors), 1)
 
-                self.assertEqual(get_queryset_tracker(authors)["cache_hits"], 2 * n - 1)
+                self.assertEqual(get_queryset_tracker(authors).cache_hits, 2 * n - 1)
 
 
 class TestInstanceTracking(TestCase):
@@ -350,7 +403,7 @@ class TestInstanceTracking(TestCase):
 
         queryset = get_instance_tracker(book).queryset
         self.assertEqual(len(queryset.instance_trackers[("", Book)]), 3)
-        self.assertEqual(queryset["num_instances"], 3)
+        self.assertEqual(queryset.num_instances, 3)
 
 
 class TestValuesIterable(TestCase):
@@ -360,14 +413,83 @@ class TestValuesIterable(TestCase):
         objs = Author.objects.values()
         for obj in objs:
             self.assertIsInstance(obj, TrackedDict)
+            self.assertIsInstance(obj, dict)
             obj["date_of_birth"]
-            tracker = get_instance_tracker(obj)
-            self.assertEqual(tracker["date_of_birth"].get, 1)
-            self.assertEqual(tracker["date_of_birth"].set, 0)
+            obj.get("user_id")
+            self.assertEqual(obj.counters.get_count(obj.row, "date_of_birth"), 1)
+            self.assertEqual(obj.counters.get_count(obj.row, "user_id"), 1)
+            self.assertEqual(obj.counters.get_count(obj.row, "id"), 0)
 
         qs_tracker = get_queryset_tracker(objs)
         self.assertIsInstance(qs_tracker, QuerySetTracker)
-        self.assertEqual(qs_tracker["num_instances"], 3)
+        self.assertEqual(qs_tracker.num_instances, 3)
+        self.assertEqual(len({obj.counters for obj in objs}), 1)
+
+    def test_dict_behaviour(self):
+        AuthorFactory()
+
+        obj = Author.objects.values("id", "user_id")[0]
+        self.assertEqual(json.loads(json.dumps(obj)), dict(obj))
+        self.assertEqual(obj.counters.get_count(obj.row, "id"), 1)
+        self.assertIs(type(pickle.loads(pickle.dumps(obj))), dict)
+        with self.assertRaises(KeyError):
+            obj["name"]
+
+    def test_field_trackings(self):
+        AuthorFactory.create_batch(3)
+
+        objs = Author.objects.values("id", "user_id")
+        self.assertEqual(len(objs), 3)
+        objs[0]["id"]
+        objs[1]["id"]
+        objs[1]["id"]
+
+        qs_tracker = get_queryset_tracker(objs)
+        del objs
+        self.assertTrue(qs_tracker.ready)
+        self.assertEqual(
+            count_row_gets(*qs_tracker.row_counts),
+            {
+                ("id", None): 1,
+                ("id", FieldTracker(1)): 1,
+                ("id", FieldTracker(2)): 1,
+                ("user_id", None): 3,
+            },
+        )
+
+    def test_streaming(self):
+        AuthorFactory.create_batch(7)
+        qs = Author.objects.values("id", "user_id")
+
+        for i, obj in enumerate(qs.iterator(chunk_size=2)):
+            obj["id"]
+            if i % 2:
+                obj["id"]
+            qs_tracker = get_queryset_tracker(qs)
+            # Only the counters of the current chunk are retained.
+            self.assertLessEqual(obj.counters.num_rows, 2)
+            self.assertLessEqual(len(qs_tracker.row_chunks or ()), 1)
+
+        obj = None
+        self.assertTrue(qs_tracker.ready)
+        self.assertTrue(qs_tracker.folded_trackings)
+        self.assertEqual(qs_tracker.num_instances, 7)
+        self.assertEqual(
+            qs_tracker.get_instance_trackings(),
+            {
+                (
+                    Author,
+                    "",
+                    HashableCounter(
+                        {
+                            ("id", FieldTracker(1)): 4,
+                            ("id", FieldTracker(2)): 3,
+                            ("user_id", None): 7,
+                        }
+                    ),
+                )
+            },
+        )
 
 
 class TestValuesListIterable(TestCase):
@@ -377,15 +499,25 @@ class TestValuesListIterable(TestCase):
         objs = Author.objects.values_list()
         for obj in objs:
             self.assertIsInstance(obj, TrackedSequence)
+            self.assertIsInstance(obj, tuple)
             pk, user_id, date_of_birth, date_of_death = obj
-            tracker = get_instance_tracker(obj)
-            for i in range(4):
-                self.assertEqual(tracker[str(i)].get, 1)
-                self.assertEqual(tracker[str(i)].set, 0)
+            obj[-1]
+            obj[1:3]
+            for i, count in enumerate((1, 2, 2, 2)):
+                self.assertEqual(obj.counters.get_count(obj.row, str(i)), count)
 
         qs_tracker = get_queryset_tracker(objs)
         self.assertIsInstance(qs_tracker, QuerySetTracker)
-        self.assertEqual(qs_tracker["num_instances"], 3)
+        self.assertEqual(qs_tracker.num_instances, 3)
+
+    def test_tuple_behaviour(self):
+        AuthorFactory()
+
+        obj = Author.objects.values_list("id", "user_id")[0]
+        self.assertEqual(obj, (obj[0], obj[1]))
+        self.assertEqual(hash(obj), hash(tuple(obj)))
+        self.assertEqual(json.loads(json.dumps(obj)), list(obj))
+        self.assertIs(type(pickle.loads(pickle.dumps(obj))), tuple)
 
     def test_flat_values_list(self):
         BookFactory.create_batch(3)
@@ -399,10 +531,514 @@ class TestValuesListIterable(TestCase):
 
                 qs_tracker = get_queryset_tracker(objs)
                 self.assertIsInstance(qs_tracker, QuerySetTracker)
-                self.assertEqual(qs_tracker["num_instances"], 3)
+                self.assertEqual(qs_tracker.num_instances, 3)
                 self.assertEqual(qs_tracker.num_ready, 3)
 
 
+class TestFieldCounters(TestCase):
+    def test_field_trackings(self):
+        BookFactory.create_batch(3)
+
+        qs = Book.objects.all()
+        for i, book in enumerate(qs):
+            if i:
+                book.title
+            if i == 2:
+                book.title = "title"
+
+        self.assertEqual(len({get_instance_tracker(book).counters for book in qs}), 1)
+        self.assertEqual(
+            count_field_trackings(
+                get_queryset_tracker(qs).instance_trackers[("", Book)]
+            ),
+            {
+                ("id", None): 3,
+                ("summary", None): 3,
+                ("category_id", None): 3,
+                ("title", None): 1,
+                ("title", FieldTracker(1, 0)): 1,
+                ("title", FieldTracker(1, 1)): 1,
+            },
+        )
+
+    def test_pickled_field_counts(self):
+        BookFactory.create_batch(2)
+
+        qs = Book.objects.all()
+        for book in qs:
+            book.title
+
+        tracker = get_queryset_tracker(qs)
+        field_counts = pickle.loads(pickle.dumps(tracker.get_field_counts()))
+        self.assertEqual(
+            count_instance_trackings(field_counts), tracker.get_instance_trackings()
+        )
+
+    def test_counters_released(self):
+        BookFactory.create_batch(2)
+
+        # The collector doesn't retain the tracker.
+        with mock.patch.object(
+            DummyRequestTracker, "add_tracker", lambda tracker: None
+        ):
+            books = list(Book.objects.all())
+
+        counters = weakref.ref(get_instance_tracker(books[0]).counters)
+        del books
+        Collector.drain()
+        # Instance trackers and their queryset tracker reference each other.
+        gc.collect()
+        self.assertIsNone(counters())
+
+    def test_interleaved_queries(self):
+        BookFactory.create_batch(2)
+
+        outer = []
+        for book in Book.objects.iterator(chunk_size=1):
+            outer.append(book)
+            self.assertEqual(len(list(Book.objects.iterator(chunk_size=1))), 2)
+
+        self.assertEqual(
+            len({get_instance_tracker(book).counters for book in outer}), 1
+        )
+        self.assertEqual([get_instance_tracker(book).row for book in outer], [0, 1])
+
+
+class TestFieldDescriptors(TestCase):
+    @staticmethod
+    def load_fallback():
+        spec = importlib.util.spec_from_file_location(
+            "field_descriptors_fallback", field_descriptors.__file__
+        )
+        module = importlib.util.module_from_spec(spec)
+        with mock.patch.dict(sys.modules, {"dj_tracker._field_descriptors": None}):
+            spec.loader.exec_module(module)
+        return module
+
+    def test_implementations(self):
+        fallback = self.load_fallback()
+        self.assertEqual(fallback.FieldDescriptor.__module__, fallback.__name__)
+
+        class Attribute:
+            def __get__(self, instance, cls):
+                return self if instance is None else instance.__dict__["value"]
+
+            def __set__(self, instance, value):
+                instance.__dict__["value"] = value
+
+            def _check_parent_chain(self, instance):
+                return None
+
+        for module in (field_descriptors, fallback):
+            for Descriptor in (
+                module.EditableFieldDescriptor,
+                module.DeferredAttributeDescriptor,
+            ):
+                with self.subTest(module=module.__name__, descriptor=Descriptor):
+
+                    class Row:
+                        value = Descriptor(Attribute(), "value")
+
+                    self.assertIsInstance(Row.value, Attribute)
+
+                    untracked = Row()
+                    untracked.value = 1
+                    self.assertEqual(untracked.value, 1)
+
+                    row = Row()
+                    row._tracker = tracker = FieldCounters(
+                        ["value"]
+                    ).new_instance_tracker()
+                    row.value = 1
+                    self.assertEqual(row.value + row.value, 2)
+                    self.assertEqual(tracker["value"], FieldTracker(2, 1))
+
+
+class TestInstancesSweep(TestCase):
+    def test_sweep(self):
+        BookFactory.create_batch(3)
+
+        qs = Book.objects.all()
+        books = list(qs)
+        qs_tracker = get_queryset_tracker(qs)
+        del qs
+        self.assertFalse(qs_tracker.ready)
+
+        # The sweep stops at the first live instance.
+        books.pop()
+        self.assertFalse(qs_tracker.ready)
+        self.assertEqual(qs_tracker.num_ready, 0)
+
+        books.pop(0)
+        self.assertFalse(qs_tracker.ready)
+        self.assertEqual(qs_tracker.num_ready, 1)
+
+        del books
+        print(
+            qs_tracker._result_cache_collected,
+            qs_tracker.num_ready,
+            qs_tracker.num_instances,
+            qs_tracker._iter_done,
+        )
+        self.assertTrue(qs_tracker.ready)
+        self.assertEqual(qs_tracker.num_ready, 3)
+
+        Collector.sweep_trackers()
+        self.assertNotIn(qs_tracker, Collector.trackers)
+
+    def test_sweep_from_collector(self):
+        BookFactory.create_batch(2)
+        sweeping_threads = set()
+
+        def sweep(tracker):
+            sweeping_threads.add(threading.current_thread())
+
+        with mock.patch.object(QuerySetTracker, "sweep", sweep):
+            qs = Book.objects.all()
+            list(qs)
+            qs_tracker = get_queryset_tracker(qs)
+            del qs
+        # Collected result caches are only staged for the collector.
+        self.assertNotIn(threading.current_thread(), sweeping_threads)
+
+        Collector.sweep_trackers()
+        self.assertNotIn(qs_tracker, Collector.trackers)
+
+
+class TestMaxTrackerAge(TestCase):
+    def test_flush(self):
+        BookFactory.create_batch(3)
+
+        qs = Book.objects.all()
+        books = list(qs)
+        qs_tracker = get_queryset_tracker(qs)
+        del qs
+        Collector.drain()
+        self.assertIn(qs_tracker, Collector.trackers)
+        num_flushed = Collector.num_trackers_flushed
+
+        Collector.sweep_trackers()
+        self.assertIn(qs_tracker, Collector.trackers)
+
+        with mock.patch.object(collector, "MAX_TRACKER_AGE", 1e-9):
+            Collector.sweep_trackers()
+        self.assertNotIn(qs_tracker, Collector.trackers)
+        self.assertTrue(qs_tracker.flushed)
+        self.assertGreater(Collector.num_trackers_flushed, num_flushed)
+
+        # Queries run from the instances still alive are tracked on their own.
+        self.assertTrue(books[0].category.name)
+        category_tracker = get_instance_tracker(books[0].category).queryset
+        self.assertFalse(category_tracker.is_related)
+        self.assertIsNone(category_tracker.field)
+
+
+@unittest.skipUnless(hasattr(os, "fork"), "Requires os.fork")
+class TestFork(TestCase):
+    def test_after_fork(self):
+        self.assertTrue(Collector.stats()["running"])
+        stopping = Collector.stopping
+        read_fd, write_fd = os.pipe()
+
+        with mock.patch.object(Collector, "num_trackers", 5):
+            if not (pid := os.fork()):
+                try:
+                    stats = Collector.stats()
+                    stats["new_event"] = Collector.stopping is not stopping
+                    os.write(write_fd, json.dumps(stats).encode())
+                finally:
+                    os._exit(0)
+
+        os.close(write_fd)
+        with os.fdopen(read_fd) as f:
+            stats = json.load(f)
+        os.waitpid(pid, 0)
+
+        self.assertEqual(stats["pid"], pid)
+        self.assertTrue(stats["running"])
+        self.assertTrue(stats["new_event"])
+        self.assertEqual(stats["num_trackers"], 0)
+        self.assertEqual(stats["num_trackers_active"], 0)
+        self.assertEqual(stats["num_requests"], 0)
+        self.assertEqual(Collector.stats()["pid"], os.getpid())
+
+    def test_locks_held_at_fork(self):
+        def get_locks():
+            return (
+                SQLPromise.lock,
+                QueryPromise.lock,
+                DummyRequestTracker.lock,
+                RequestTracker.discarded_lock,
+                tracker._lock,
+                tracker._tracker_lock,
+            )
+
+        held, release = threading.Event(), threading.Event()
+
+        def hold_locks():
+            locks = get_locks()
+            for lock in locks:
+                lock.acquire()
+            held.set()
+            release.wait()
+            for lock in reversed(locks):
+                lock.release()
+
+        holder = threading.Thread(target=hold_locks)
+        read_fd, write_fd = os.pipe()
+
+        with mock.patch.dict(
+            SQLPromise.to_resolve, {42: SQLPromise(42, {"sql": "SELECT 42"})}
+        ), mock.patch.dict(QueryPromise.durations, {42: 1}):
+            holder.start()
+            held.wait()
+            try:
+                if not (pid := os.fork()):
+                    try:
+                        # Terminates the child if it deadlocks.
+                        signal.alarm(5)
+                        state = {
+                            "acquired": [
+                                lock.acquire(blocking=False) for lock in get_locks()
+                            ],
+                            "to_resolve": len(SQLPromise.to_resolve),
+                            "durations": len(QueryPromise.durations),
+                        }
+                        for lock in get_locks():
+                            lock.release()
+                        SQLPromise.get_or_create(sql="SELECT 1")
+                        DummyRequestTracker.pop_queries()
+                        RequestTracker.pop_discarded()
+                        os.write(write_fd, json.dumps(state).encode())
+                    finally:
+                        os._exit(0)
+            finally:
+                release.set()
+                holder.join()
+
+        os.close(write_fd)
+        with os.fdopen(read_fd) as f:
+            state = json.load(f)
+        os.waitpid(pid, 0)
+
+        self.assertEqual(state["acquired"], [True] * 6)
+        self.assertEqual(state["to_resolve"], 0)
+        self.assertEqual(state["durations"], 0)
+
+
+class TestStagingBuffers(TestCase):
+    databases = {"default", "trackings"}
+
+    def make_tracker(self):
+        qs = Book.objects.all()
+        qs_tracker = QuerySetTracker(qs, QueryType.SELECT, traceback=get_traceback())
+        qs_tracker.sql = 'SELECT "tests_book"."id" FROM "tests_book"'
+        qs_tracker.iter_done(qs, 1)
+        qs_tracker.result_cache_collected()
+
+    def test_stage_holding_lock(self):
+        # E.g a finalizer staging an operation while the thread removes a buffer.
+        def stage():
+            with Collector.buffers_lock:
+                Collector.get_buffer()
+
+        thread = threading.Thread(target=stage, daemon=True)
+        thread.start()
+        thread.join(timeout=5)
+        self.assertFalse(thread.is_alive())
+
+    def test_concurrent_trackers(self):
+        num_threads, num_trackers = 16, 200
+        # Save what's pending so far and start counting from there.
+        Collector.stop()
+        Collector.start()
+        num_saved = Collector.num_trackers_saved
+        num_tracked = Collector.num_trackers
+
+        def make_trackers():
+            for _ in range(num_trackers):
+                self.make_tracker()
+
+        threads = [threading.Thread(target=make_trackers) for _ in range(num_threads)]
+        for thread in threads:
+            thread.start()
+        # Drain concurrently with the producers and the collector.
+        while any(thread.is_alive() for thread in threads):
+            Collector.drain()
+        for thread in threads:
+            thread.join()
+
+        Collector.stop()
+        Collector.start()
+        self.assertEqual(
+            Collector.num_trackers - num_tracked, num_threads * num_trackers
+        )
+        self.assertEqual(
+            Collector.num_trackers_saved - num_saved, num_threads * num_trackers
+        )
+        # Buffers of finished threads are dropped.
+        buffer_threads = {thread for thread, _ in Collector.buffers}
+        self.assertFalse(buffer_threads.intersection(threads))
+        self.assertEqual(Collector.stats()["num_staged"], 0)
+
+
+class TestCollectorProcess(TestCase):
+    databases = {"default", "trackings"}
+
+    def serve_in_thread(self):
+        conn, child_conn = multiprocessing.Pipe()
+        # The serving end runs in a thread to share the test databases.
+        server = threading.Thread(
+            target=serve, args=(child_conn, settings.SETTINGS_MODULE)
+        )
+        server.start()
+        process = CollectorProcess(conn, server)
+        self.addCleanup(process.stop)
+        return process
+
+    def test_save_trackers(self):
+        # Collections are run from the test instead.
+        Collector.stop()
+        self.addCleanup(Collector.start)
+        # Only the first test of the class can save from another thread:
+        # the trackings tables are read by the constraint checks run after each test.
+        process = self.serve_in_thread()
+
+        BookFactory.create_batch(2)
+        books = Book.objects.all()
+        list(books)
+        qs_tracker = get_queryset_tracker(books)
+        del books
+        Collector.sweep_trackers()
+        self.assertIn(qs_tracker, Collector.trackers_ready)
+        num_saved = Collector.num_trackers_saved
+
+        with mock.patch.object(Collector, "process", process):
+            Collector.save_trackers()
+            self.assertEqual(Collector.num_trackers_saved, num_saved + 1)
+            self.assertNotIn(qs_tracker, Collector.trackers_ready)
+
+            # Counted in the web process, saved in the collector process.
+            (query_id,) = DummyRequestTracker.queries
+            Collector.save_counts()
+            self.assertFalse(DummyRequestTracker.queries)
+
+        query = Query.objects.get(cache_key=query_id)
+        self.assertEqual(query.num_instances, 2)
+        self.assertTrue(
+            QuerySetTracking.objects.filter(
+                query_group_id=DummyRequestTracker.query_group_id, query=query
+            ).exists()
+        )
+
+        # Errors are raised in the web process.
+        with self.assertLogs("dj_tracker", "ERROR"):
+            with self.assertRaises(ValueError):
+                process.call("save_discarded", {("path",): 1})
+
+    def test_spawn(self):
+        process = CollectorProcess.spawn()
+        process.stop()
+        self.assertEqual(process.worker.exitcode, 0)
+
+    def test_spawned_process_save(self):
+        # The spawned process can't open the in-memory test databases:
+        # it saves in a copy of the trackings database instead.
+        tmp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp_dir.cleanup)
+        db_path = os.path.join(tmp_dir.name, "trackings.sqlite3")
+        connection = connections["trackings"]
+        connection.ensure_connection()
+        with closing(sqlite3.connect(db_path)) as db:
+            connection.connection.backup(db)
+
+        with mock.patch.dict(os.environ, DJ_TRACKER_TEST_DB=db_path):
+            process = CollectorProcess.spawn("tests.collector_settings")
+        self.addCleanup(process.stop)
+
+        BookFactory.create_batch(2)
+        books = Book.objects.all()
+        for book in books:
+            book.title
+
+        state = get_queryset_tracker(books).get_saved_state()
+        (query_id,) = process.save_queryset_states([state])
+        process.stop()
+        self.assertEqual(process.worker.exitcode, 0)
+
+        with closing(sqlite3.connect(db_path)) as db:
+            self.assertEqual(
+                db.execute(
+                    "SELECT num_instances FROM dj_tracker_query WHERE cache_key = %s"
+                    % query_id
+                ).fetchall(),
+                [(2,)],
+            )
+            # Field counters were reduced by the spawned process.
+            self.assertEqual(
+                db.execute(
+                    "SELECT COUNT(*) FROM dj_tracker_query_instance_trackings"
+                    " WHERE query_id = %s" % query_id
+                ).fetchone(),
+                (1,),
+            )
+
+    def test_stopped_process(self):
+        process = CollectorProcess.spawn()
+        self.addCleanup(process.stop)
+        pid = process.pid
+        process.worker.kill()
+        process.worker.join()
+
+        BookFactory.create_batch(2)
+        books = Book.objects.all()
+        list(books)
+        state = get_queryset_tracker(books).get_saved_state()
+
+        # Saved in the current process, then the collector process is restarted.
+        # Saving is mocked: the running collector reads the tables it writes to.
+        with mock.patch.object(
+            QuerySetTracker, "save_states", return_value=[1]
+        ) as save_states:
+            with self.assertLogs("dj_tracker", "ERROR"):
+                self.assertEqual(process.save_queryset_states([state]), [1])
+        save_states.assert_called_once_with([state])
+        self.assertNotIn(process.pid, (None, pid))
+
+        process.stop()
+        self.assertIsNone(process.pid)
+        self.assertEqual(process.worker.exitcode, 0)
+
+    def test_settings_configure(self):
+        # Settings passed to `settings.configure()` can't be loaded by the collector process.
+        with mock.patch.object(settings, "SETTINGS_MODULE", None):
+            with self.assertRaises(ImproperlyConfigured):
+                CollectorProcess.spawn()
+
+            with mock.patch.object(Collector, "process", None):
+                with self.assertLogs("dj_tracker", "ERROR"):
+                    Collector.start_process()
+                self.assertIsNone(Collector.process)
+
+
+class TestQuerySetTracker(TestCase):
+    def test_to_kwargs(self):
+        BookFactory.create_batch(2)
+        books = Book.objects.all()
+        self.assertEqual(len(books), 2)
+
+        qs_tracker = get_queryset_tracker(books)
+        self.assertFalse(hasattr(qs_tracker, "__dict__"))
+        kwargs = qs_tracker.to_kwargs()
+        self.assertEqual(kwargs["model"], Book)
+        self.assertEqual(kwargs["num_instances"], 2)
+        self.assertTrue(kwargs["sql"])
+        self.assertEqual(kwargs["cache_hits"], 1)
+        self.assertEqual(kwargs["len_calls"], 1)
+        self.assertNotIn("depth", kwargs)
+        self.assertNotIn("field", kwargs)
+
+
 class TestCountHint(TestCase):
     def test_count_hint(self):
         AuthorFactory.create_batch(2)
@@ -414,8 +1050,8 @@ class TestCountHint(TestCase):
                     self.assertEqual(len(qs), 2)
 
                 qs_tracker = get_queryset_tracker(qs)
-                self.assertEqual(qs_tracker["len_calls"], len_calls)
-                self.assertEqual(qs_tracker["cache_hits"], 2 * len_calls - 1)
+                self.assertEqual(qs_tracker.len_calls, len_calls)
+                self.assertEqual(qs_tracker.cache_hits, 2 * len_calls - 1)
 
 
 class TestContainsHint(TestCase):
@@ -432,8 +1068,8 @@ class TestContainsHint(TestCase):
                 for _ in range(contains_calls):
                     self.assertIn(author, qs)
 
-                self.assertEqual(qs_tracker["contains_calls"], contains_calls)
-                self.assertEqual(qs_tracker["cache_hits"], 2 * contains_calls)
+                self.assertEqual(qs_tracker.contains_calls, contains_calls)
+                self.assertEqual(qs_tracker.cache_hits, 2 * contains_calls)
 
 
 class TestExistsHint(TestCase):
@@ -449,8 +1085,8 @@ class TestExistsHint(TestCase):
                 for _ in range(exists_calls):
                     self.assertTrue(qs)
 
-                self.assertEqual(qs_tracker["exists_calls"], exists_calls)
-                self.assertEqual(qs_tracker["cache_hits"], 2 * exists_calls)
+                self.assertEqual(qs_tracker.exists_calls, exists_calls)
+                self.assertEqual(qs_tracker.cache_hits, 2 * exists_calls)
 
 
 class TestIterator(TestCase):
@@ -466,6 +1102,36 @@ class TestIterator(TestCase):
         el = None
         self.assertTrue(tracker.ready)
 
+    def test_streaming(self):
+        BookFactory.create_batch(7)
+        qs = Book.objects.select_related("category")
+
+        for book in qs.iterator(chunk_size=2):
+            self.assertTrue(book.title)
+            if book.pk % 2:
+                self.assertTrue(book.category.name)
+            qs_tracker = get_instance_tracker(book).queryset
+            # Only the rows of the current chunk are retained.
+            self.assertLessEqual(len(qs_tracker.instance_refs), 6)
+            for trackers in qs_tracker.instance_trackers.values():
+                self.assertLessEqual(len(trackers), 3)
+                self.assertLessEqual(trackers[0].counters.num_rows, 3)
+
+        book = None
+        self.assertTrue(qs_tracker.ready)
+        self.assertTrue(qs_tracker.folded_trackings)
+        self.assertEqual(qs_tracker.num_instances, 14)
+
+        books = list(qs)
+        for book in books:
+            self.assertTrue(book.title)
+            if book.pk % 2:
+                self.assertTrue(book.category.name)
+        self.assertEqual(
+            qs_tracker.get_instance_trackings(),
+            get_instance_tracker(books[0]).queryset.get_instance_trackings(),
+        )
+
 
 class TestRelatedField(TestCase):
     def test_related_field(self):
@@ -474,7 +1140,7 @@ class TestRelatedField(TestCase):
         category = book.category
         self.assertTrue(category)
         tracker = get_instance_tracker(category).queryset
-        self.assertEqual(tracker["field"], (Book, "category"))
+        self.assertEqual(tracker.field, (Book, "category"))
 
     def test_related_manager_field(self):
         category = CategoryFactory()
@@ -484,7 +1150,7 @@ class TestRelatedField(TestCase):
         books = category.books.all()
         self.assertEqual(len(books), 3)
         tracker = get_queryset_tracker(books)
-        self.assertEqual(tracker["field"], (Category, "books"))
+        self.assertEqual(tracker.field, (Category, "books"))
 
 
 class TestDepth(TestCase):
@@ -496,13 +1162,10 @@ class TestDepth(TestCase):
         self.assertEqual(len(authors), 2)
         first_author_user = authors[0].user
 
-        self.assertNotIn(
-            "depth",
-            get_instance_tracker(book).queryset,
-        )
-        self.assertEqual(get_instance_tracker(category).queryset["depth"], 1)
-        self.assertEqual(get_queryset_tracker(authors)["depth"], 1)
-        self.assertEqual(get_instance_tracker(first_author_user).queryset["depth"], 2)
+        self.assertIsNone(get_instance_tracker(book).queryset.depth)
+        self.assertEqual(get_instance_tracker(category).queryset.depth, 1)
+        self.assertEqual(get_queryset_tracker(authors).depth, 1)
+        self.assertEqual(get_instance_tracker(first_author_user).queryset.depth, 2)
 
 
 class TestAttributesAccessed(TestCase):
@@ -517,12 +1180,30 @@ class TestAttributesAccessed(TestCase):
             self.assertTrue(obj.title)
             self.assertEqual(obj.get_title_and_summary(), f"{obj.title}-{obj.summary}")
 
-        attrs_accessed = get_queryset_tracker(qs)["attributes_accessed"]
+        attrs_accessed = get_queryset_tracker(qs).attributes_accessed
         self.assertEqual(
             set(attrs_accessed.keys()), {"__dict__", "_state", "get_title_and_summary"}
         )
         self.assertEqual(attrs_accessed["get_title_and_summary"], len(qs))
 
+    def test_tracking_class(self):
+        BookFactory()
+        self.assertNotIn("__getattribute__", vars(Book))
+
+        book = Book.objects.get()
+        self.assertIsNot(type(book), Book)
+        self.assertIs(book.__class__, Book)
+        self.assertIsInstance(book, Book)
+        self.assertEqual(pickle.loads(pickle.dumps(book)), book)
+
+        with mock.patch("django.db.models.signals.post_save.send") as send:
+            book.save()
+        self.assertIs(send.call_args.kwargs["sender"], Book)
+
+        self.assertIs(type(Book(title="untracked")), Book)
+        with mock.patch.object(tracker.DUMMY_REQUEST, "_tracking_level", 3):
+            self.assertIs(type(Book.objects.get()), Book)
+
 
 class TestInheritance(TestCase):
     def test_inheritance(self):
@@ -554,15 +1235,15 @@ class TestM2MThroughModels(TestCase):
             self.assertEqual(tracker["author_id"].set, 1)
 
         qs_tracker = get_queryset_tracker(qs)
-        self.assertEqual(qs_tracker["num_instances"], 3)
-        self.assertEqual(qs_tracker["model"], BookAuthors)
+        self.assertEqual(qs_tracker.num_instances, 3)
+        self.assertEqual(qs_tracker.model, BookAuthors)
 
 
 class TestEmptyQueryset(TestCase):
     def test_empty_qs(self):
         qs = Book.objects.all()
         self.assertEqual(len(qs), 0)
-        self.assertEqual(get_queryset_tracker(qs)["num_instances"], 0)
+        self.assertEqual(get_queryset_tracker(qs).num_instances, 0)
 
 
 class TestTemplateInfo(TestCase):
@@ -571,13 +1252,137 @@ class TestTemplateInfo(TestCase):
         response = self.client.get(reverse("books"))
 
         qs_tracker = get_queryset_tracker(response.context["books"])
-        self.assertEqual(qs_tracker["num_instances"], 1)
+        self.assertEqual(qs_tracker.num_instances, 1)
 
-        traceback, template_info = qs_tracker["traceback"]
+        traceback, template_info = qs_tracker.traceback
         self.assertIn("/tests/templates/tests/books.html", template_info.filename)
         self.assertEqual(template_info.code, "{% for book in books %}")
 
 
+class TestHashableCounter(TestCase):
+    def test_hash(self):
+        items = [("title", None), ("category", FieldTracker(1, 0)), (1, 3), (None, 2)]
+        counters = [
+            HashableCounter(dict(items)),
+            HashableCounter(dict(reversed(items))),
+        ]
+        self.assertEqual(hash(counters[0]), hash(counters[1]))
+
+        for other in (
+            HashableCounter(dict(items[:-1])),
+            HashableCounter({**dict(items), "title": 1}),
+            HashableCounter({**dict(items), "category": FieldTracker(0, 1)}),
+        ):
+            self.assertNotEqual(hash(other), hash(counters[0]))
+
+
+class TestHashableList(TestCase):
+    def test_hash(self):
+        lists = [HashableList(range(i, i + 3)) for i in range(1000)]
+        keys = {hash(hashable_list) for hashable_list in lists}
+        self.assertEqual(len(keys), 1000)
+        # Keys aren't truncated to 32 bits.
+        self.assertTrue(any(abs(key) >= 2**32 for key in keys))
+        self.assertNotEqual(hash(HashableList([1, 2])), hash(HashableList([2, 1])))
+
+    def test_traceback_entries(self):
+        def run_query():
+            return get_traceback()
+
+        stack, _ = run_query()
+        entry = stack[0]
+        self.assertEqual(entry.hash_value, hash((entry.rel_path, entry.lineno)))
+
+
+class TestHashString(TestCase):
+    def test_hash_string(self):
+        # Cache keys are stored in the database, they mustn't change.
+        self.assertEqual(hash_string(""), -7207201254813729732)
+        self.assertEqual(hash_string("SELECT 1"), -8745426392732915026)
+
+        # Non-ASCII strings are hashed from all of their UTF-8 bytes.
+        self.assertNotEqual(hash_string("é"), hash_string("è"))
+        self.assertNotEqual(hash_string("/books/é"), hash_string("/books/è"))
+
+        keys = {hash_string(f"SELECT {i}") for i in range(1000)}
+        self.assertEqual(len(keys), 1000)
+        self.assertTrue(all(-(2**63) <= key < 2**63 for key in keys))
+        self.assertTrue(any(abs(key) >= 2**32 for key in keys))
+
+
+class TestMatchers(TestCase):
+    def test_compile_substrings(self):
+        pattern = compile_substrings({"django/db", "a.b", "/dj-tracker/"})
+        for string, found in (
+            ("site-packages/django/db/models/query.py", True),
+            ("/dj-tracker/requests/", True),
+            ("a.b", True),
+            ("axb", False),
+            ("django/template", False),
+        ):
+            with self.subTest(string=string):
+                self.assertEqual(pattern.search(string) is not None, found)
+
+        self.assertIsNone(compile_substrings(()).search("anything"))
+
+    def test_path_prefixes(self):
+        prefixes = PathPrefixes()
+        with mock.patch.object(sys, "path", ["", "/usr/lib", "/usr"]):
+            self.assertEqual(prefixes.match("/usr/lib/python/os.py"), "/usr/lib")
+            self.assertEqual(prefixes.match("/usr/local/app.py"), "/usr")
+            self.assertIsNone(prefixes.match("/app/app.py"))
+
+            sys.path.insert(0, "/app")
+            self.assertEqual(prefixes.match("/app/app.py"), "/app")
+            sys.path.append("/srv")
+            self.assertEqual(prefixes.match("/srv/app.py"), "/srv")
+            sys.path.pop(0)
+            self.assertIsNone(prefixes.match("/app/app.py"))
+
+        with mock.patch.object(sys, "path", ["/app"]):
+            self.assertEqual(prefixes.match("/app/app.py"), "/app")
+
+
+class TestTracebackCache(TestCase):
+    def test_get_traceback(self):
+        # The frame calling `get_traceback` isn't part of the traceback.
+        def run_query():
+            return get_traceback()
+
+        tracebacks = [run_query() for _ in range(2)]
+        self.assertIs(tracebacks[0], tracebacks[1])
+        other_traceback = run_query()
+        self.assertIsNot(other_traceback, tracebacks[0])
+        self.assertEqual(other_traceback[0][0].lineno, tracebacks[0][0][0].lineno + 2)
+
+    def test_deferred_resolution(self):
+        def run_query():
+            return get_traceback()
+
+        traceback = run_query()
+        self.assertIsNone(traceback.resolved)
+        # Pickling doesn't resolve the traceback, unpickling does.
+        pickled = pickle.dumps(traceback)
+        self.assertIsNone(traceback.resolved)
+        stack, template_info = traceback
+        self.assertIs(traceback.resolved[0], stack)
+        self.assertEqual(stack[0].func, "test_deferred_resolution")
+        self.assertIsNone(template_info)
+        for data in (pickled, pickle.dumps(traceback)):
+            unpickled_stack, template_info = pickle.loads(data)
+            self.assertEqual(list(map(repr, unpickled_stack)), list(map(repr, stack)))
+            self.assertEqual(hash(unpickled_stack), hash(stack))
+            self.assertIsNone(template_info)
+
+    def test_template_info(self):
+        BookFactory()
+        responses = [self.client.get(reverse("books")) for _ in range(2)]
+        self.assertIs(
+            get_queryset_tracker(responses[0].context["books"]).traceback,
+            get_queryset_tracker(responses[1].context["books"]).traceback,
+        )
+
+
 class TestPickleability(TestCase):
     def test_pickleability(self):
         BookFactory(authors=AuthorFactory.create_batch(2))
@@ -593,3 +1398,581 @@ class TestPickleability(TestCase):
         for instance in (book.category, *authors, *users):
             with self.subTest(instance=instance):
                 self.assertEqual(pickle.loads(pickle.dumps(instance)), instance)
+
+
+class TestSampling(TestCase):
+    def setUp(self):
+        tracker.get_sample_rate.cache_clear()
+        self.addCleanup(tracker.get_sample_rate.cache_clear)
+
+    def test_sample_rate(self):
+        self.assertEqual(tracker.get_sample_rate("/books/"), 1)
+        self.assertEqual(tracker.get_sample_rate("/dj-tracker/requests/"), 0)
+
+        with mock.patch.dict(tracker.SAMPLE_RATES, {"/books/": 0.5}):
+            tracker.get_sample_rate.cache_clear()
+            self.assertEqual(tracker.get_sample_rate("/books/"), 0.5)
+
+    def test_unsampled_request(self):
+        BookFactory()
+
+        with mock.patch.dict(tracker.SAMPLE_RATES, {"/books/": 0}):
+            response = self.client.get(reverse("books"))
+
+        books = response.context["books"]
+        self.assertEqual(len(books), 1)
+        self.assertFalse(hasattr(books, "_tracker"))
+        self.assertFalse(hasattr(books[0], "_tracker"))
+        self.assertNotIn("_tracker", response.wsgi_request.__dict__)
+
+
+@mock.patch("dj_tracker.datastructures.ADAPTIVE_SAMPLING_MAX_INTERVAL", 4)
+@mock.patch("dj_tracker.datastructures.ADAPTIVE_SAMPLING_THRESHOLD", 2)
+class TestAdaptiveSampling(TestCase):
+    def test_call_site(self):
+        call_site = CallSite()
+        self.assertTrue(call_site.should_track())
+        call_site.tracked(1)
+        self.assertTrue(call_site.should_track())
+        call_site.tracked(2)
+        self.assertEqual(call_site.query_id, 2)
+
+        self.assertEqual(
+            [call_site.should_track() for _ in range(12)],
+            [False, True, False, False, False, True, False, False, False, True]
+            + [False, False],
+        )
+
+    def test_call_site_hash_collision(self):
+        class Traceback:
+            def __hash__(self):
+                return 42
+
+        first, second = Traceback(), Traceback()
+        call_site = CallSite.get(first, Author, QueryType.SELECT)
+        self.assertIs(CallSite.get(first, Author, QueryType.SELECT), call_site)
+        self.assertIsNot(CallSite.get(second, Author, QueryType.SELECT), call_site)
+
+    def test_evicted_traceback(self):
+        def run_query():
+            return get_traceback()
+
+        # Each code object gets a traceback of its own in the cache
+        # (the frame calling `get_traceback` isn't part of the traceback).
+        codes = [
+            compile("(lambda: get_traceback())()", f"<query {i}>", "eval")
+            for i in range(1024)
+        ]
+        tracebacks = []
+        for _ in range(2):
+            tracebacks.append(run_query())
+            for code in codes:
+                eval(code, {"get_traceback": get_traceback})
+
+        first, second = tracebacks
+        self.assertIsNot(first, second)
+        self.assertEqual(first, second)
+        self.assertNotEqual(first, get_traceback())
+        self.assertIs(
+            CallSite.get(second, Author, QueryType.SELECT),
+            CallSite.get(first, Author, QueryType.SELECT),
+        )
+
+    def test_skipped_executions(self):
+        AuthorFactory.create_batch(2)
+
+        with mock.patch.object(
+            tracker, "ADAPTIVE_SAMPLING_THRESHOLD", 2
+        ), mock.patch.object(
+            DummyRequestTracker, "count_query"
+        ) as count_query, mock.patch.object(
+            tracker, "FieldCounters", wraps=FieldCounters
+        ) as field_counters:
+            querysets = []
+            for _ in range(4):
+                qs = Author.objects.all()
+                self.assertEqual(len(qs), 2)
+                querysets.append(qs)
+                if qs_tracker := getattr(qs, "_tracker", None):
+                    qs_tracker.call_site.tracked(42)
+
+        self.assertEqual(
+            [hasattr(qs, "_tracker") for qs in querysets], [True, True, False, True]
+        )
+        self.assertFalse(hasattr(querysets[2][0], "_tracker"))
+        count_query.assert_called_once_with(42)
+        # Rows of the skipped execution weren't tracked at all.
+        self.assertEqual(field_counters.call_count, 3)
+
+
+@mock.patch("dj_tracker.datastructures.TAIL_RETENTION", True)
+@mock.patch("dj_tracker.datastructures.SLOW_REQUEST_THRESHOLD", 60_000)
+class TestTailRetention(TestCase):
+    def get_books(self):
+        response = self.client.get(reverse("books"))
+        return response.wsgi_request._tracker, get_queryset_tracker(
+            response.context["books"]
+        )
+
+    def assertTrackerAdded(self, qs_tracker, added=True):
+        Collector.drain()
+        self.assertIs(
+            qs_tracker in Collector.trackers or qs_tracker in Collector.trackers_ready,
+            added,
+        )
+
+    @mock.patch("dj_tracker.datastructures.NUM_QUERIES_THRESHOLD", 10)
+    def test_request_discarded(self):
+        BookFactory()
+        request_tracker, qs_tracker = self.get_books()
+
+        self.assertFalse(request_tracker.retained)
+        self.assertIsNone(request_tracker.pending)
+        Collector.drain()
+        self.assertNotIn(request_tracker, Collector.requests)
+        self.assertTrackerAdded(qs_tracker, False)
+
+    @mock.patch("dj_tracker.datastructures.NUM_QUERIES_THRESHOLD", 1)
+    def test_request_retained(self):
+        BookFactory()
+        request_tracker, qs_tracker = self.get_books()
+
+        self.assertTrue(request_tracker.retained)
+        self.assertIsNone(request_tracker.pending)
+        self.assertTrackerAdded(qs_tracker)
+
+    @mock.patch("dj_tracker.datastructures.NUM_QUERIES_THRESHOLD", 10)
+    def test_flush(self):
+        self.addCleanup(tracker.set_request, DUMMY_REQUEST)
+        Collector.drain()
+        num_requests = Collector.num_requests
+        num_saved = Collector.num_requests_saved
+        num_discarded = Collector.num_requests_discarded
+        request_tracker = RequestFactory().get(reverse("books"))._tracker
+
+        with mock.patch.object(collector, "MAX_TRACKER_AGE", 1e-9):
+            # Running requests may still be discarded, they aren't flushed.
+            Collector.sweep_trackers()
+            self.assertIn(request_tracker, Collector.requests)
+
+            request_tracker.request_finished()
+            self.assertFalse(request_tracker.retained)
+            Collector.sweep_trackers()
+
+        self.assertNotIn(request_tracker, Collector.requests)
+        self.assertNotIn(request_tracker, Collector.requests_ready)
+        self.assertEqual(Collector.num_requests - num_requests, 1)
+        self.assertEqual(Collector.num_requests_discarded - num_discarded, 1)
+        self.assertEqual(Collector.num_requests_saved, num_saved)
+
+    def test_n_plus_one(self):
+        BookFactory.create_batch(2)
+
+        books = Book.objects.all()
+        for book in books:
+            self.assertTrue(book.category)
+
+        self.assertTrue(get_queryset_tracker(books).has_n_plus_one())
+
+        books = Book.objects.select_related("category")
+        for book in books:
+            self.assertTrue(book.category)
+
+        self.assertFalse(get_queryset_tracker(books).has_n_plus_one())
+
+
+@mock.patch.object(tracker, "ON_DEMAND_TRACKING", True)
+class TestOnDemandTracking(TestCase):
+    def setUp(self):
+        BookFactory()
+        tracker.get_sample_rate.cache_clear()
+        self.addCleanup(tracker.get_sample_rate.cache_clear)
+
+    def get_books(self, **kwargs):
+        with mock.patch.dict(tracker.SAMPLE_RATES, {"/books/": 0}):
+            response = self.client.get(reverse("books"), **kwargs)
+        return response.context["books"]
+
+    def test_untracked(self):
+        self.assertFalse(hasattr(self.get_books(), "_tracker"))
+        self.assertFalse(
+            hasattr(self.get_books(HTTP_X_DJ_TRACKER="invalid"), "_tracker")
+        )
+
+    def test_header(self):
+        books = self.get_books(HTTP_X_DJ_TRACKER=tracker.make_tracking_token())
+        self.assertEqual(get_queryset_tracker(books).num_instances, 1)
+        self.assertEqual(get_queryset_tracker(books).request_tracker.sample_rate, 1)
+
+    def test_cookie(self):
+        self.client.cookies[tracker.TOKEN_COOKIE] = tracker.make_tracking_token()
+        books = self.get_books()
+        self.assertEqual(get_queryset_tracker(books).num_instances, 1)
+
+    def test_invalid_level(self):
+        with self.assertRaises(ValueError):
+            tracker.make_tracking_token(42)
+
+        # Tokens signed with an unknown level are ignored.
+        token = signing.dumps(42, salt=tracker.TOKEN_SALT)
+        self.assertFalse(hasattr(self.get_books(HTTP_X_DJ_TRACKER=token), "_tracker"))
+
+
+class TestTrackingLevels(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        BookFactory()
+
+    def get_books(self, level):
+        with mock.patch.object(tracker, "TRACKING_LEVEL", level):
+            response = self.client.get(reverse("books"))
+        return response.wsgi_request, response.context["books"]
+
+    def test_counts(self):
+        request, books = self.get_books(TrackingLevel.COUNTS)
+        self.assertFalse(hasattr(books, "_tracker"))
+        self.assertFalse(hasattr(books[0], "_tracker"))
+        self.assertEqual(request._tracker.num_counted_queries, 1)
+        self.assertGreater(request._tracker.counted_queries_duration, 0)
+
+    def test_queries(self):
+        request, books = self.get_books(TrackingLevel.QUERIES)
+        qs_tracker = get_queryset_tracker(books)
+        self.assertEqual(qs_tracker.num_instances, 1)
+        self.assertEqual(qs_tracker.num_ready, 1)
+        self.assertTrue(qs_tracker.sql)
+        self.assertFalse(hasattr(books[0], "_tracker"))
+        self.assertEqual(request._tracker.num_counted_queries, 0)
+
+    def test_instances(self):
+        _, books = self.get_books(TrackingLevel.INSTANCES)
+        self.assertIn("title", get_instance_tracker(books[0]))
+        self.assertIsNone(get_queryset_tracker(books).attributes_accessed)
+
+    def test_attributes(self):
+        _, books = self.get_books(TrackingLevel.ATTRIBUTES)
+        self.assertIn("title", get_instance_tracker(books[0]))
+        self.assertIsNotNone(get_queryset_tracker(books).attributes_accessed)
+
+
+class TestRuntimeControl(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        BookFactory()
+
+    def get_books(self):
+        return self.client.get(reverse("books")).context["books"]
+
+    def test_pause_resume(self):
+        tracker.pause()
+        try:
+            self.assertFalse(hasattr(self.get_books(), "_tracker"))
+            self.assertFalse(hasattr(Book.objects.all()[0], "_tracker"))
+        finally:
+            tracker.resume()
+        self.assertTrue(hasattr(self.get_books(), "_tracker"))
+
+    # The collector saves trackings when it stops, which can't be done while a test runs.
+    @mock.patch.multiple(Collector, start=mock.DEFAULT, stop=mock.DEFAULT)
+    def test_uninstall(self, start, stop):
+        descriptor = Book.__dict__["title"]
+        tracker.uninstall()
+        try:
+            self.assertNotIn("__patched", vars(QuerySet))
+            self.assertNotIn("from_db", vars(Book))
+            self.assertNotIn("__getattribute__", vars(Book))
+            self.assertIs(Book.__dict__["title"], descriptor.descriptor)
+            stop.assert_called_once_with()
+            books = Book.objects.all()
+            self.assertEqual(len(books), 1)
+            self.assertFalse(hasattr(books, "_tracker"))
+        finally:
+            tracker.start()
+        start.assert_called_once_with()
+        self.assertTrue(hasattr(self.get_books(), "_tracker"))
+
+    def test_control_file(self):
+        with tempfile.TemporaryDirectory() as tmpdir:
+            control_file = os.path.join(tmpdir, "control")
+            with mock.patch.object(tracker, "CONTROL_FILE", control_file), mock.patch(
+                "dj_tracker.management.commands.dj_tracker.CONTROL_FILE", control_file
+            ):
+                self.assertIsNone(tracker.check_control_file())
+                call_command("dj_tracker", "pause", stdout=open(os.devnull, "w"))
+                tracker.check_control_file().join()
+                self.assertTrue(tracker._paused)
+                # Unchanged file.
+                self.assertIsNone(tracker.check_control_file())
+                call_command("dj_tracker", "resume", stdout=open(os.devnull, "w"))
+                os.utime(control_file, ns=(0, 0))
+                tracker.check_control_file().join()
+                self.assertFalse(tracker._paused)
+
+        with self.assertRaises(CommandError):
+            call_command("dj_tracker", "pause")
+
+    @mock.patch.object(tracker, "start_watcher")
+    @mock.patch.multiple(Collector, start=mock.DEFAULT, stop=mock.DEFAULT)
+    def test_control_file_at_start(self, start_watcher, start, stop):
+        def write(action):
+            call_command("dj_tracker", action, stdout=open(os.devnull, "w"))
+
+        with tempfile.TemporaryDirectory() as tmpdir:
+            control_file = os.path.join(tmpdir, "control")
+            with mock.patch.object(tracker, "CONTROL_FILE", control_file), mock.patch(
+                "dj_tracker.management.commands.dj_tracker.CONTROL_FILE", control_file
+            ):
+                tracker.uninstall()
+                try:
+                    # Actions written before a process starts are applied.
+                    write("uninstall")
+                    tracker.start()
+                    self.assertFalse(tracker._started)
+                    self.assertNotIn("__patched", vars(QuerySet))
+                    start_watcher.assert_called_once_with()
+
+                    write("pause")
+                    tracker.start()
+                    self.assertTrue(tracker._started)
+                    self.assertTrue(tracker._paused)
+                    self.assertIsNone(tracker.check_control_file())
+
+                    # The watcher outlives `uninstall`.
+                    write("uninstall")
+                    os.utime(control_file, ns=(0, 0))
+                    tracker.check_control_file().join()
+                    self.assertFalse(tracker._started)
+                    write("start")
+                    tracker.check_control_file().join()
+                    self.assertTrue(tracker._started)
+                    self.assertFalse(tracker._paused)
+                finally:
+                    tracker.resume()
+                    tracker.start()
+
+        self.assertTrue(hasattr(self.get_books(), "_tracker"))
+
+
+class TestModelSelection(TestCase):
+    @staticmethod
+    def get_tracked_models(**settings):
+        spec = importlib.util.spec_from_file_location(
+            "constants_copy", constants.__file__
+        )
+        module = importlib.util.module_from_spec(spec)
+        spec.loader.exec_module(module)
+        module.DJ_TRACKER_SETTINGS = {
+            "APPS_TO_EXCLUDE": (),
+            "APPS_TO_INCLUDE": None,
+            "MODELS_TO_INCLUDE": None,
+            **settings,
+        }
+        return module.TRACKED_MODELS
+
+    def test_include_lists(self):
+        self.assertTrue({Book, Author, Group} <= self.get_tracked_models())
+
+        tracked_models = self.get_tracked_models(
+            APPS_TO_INCLUDE=["auth"], MODELS_TO_INCLUDE=["tests.Book"]
+        )
+        self.assertIn(Book, tracked_models)
+        self.assertIn(Group, tracked_models)
+        self.assertNotIn(Author, tracked_models)
+
+        tracked_models = self.get_tracked_models(
+            APPS_TO_INCLUDE=["auth", "tests"], APPS_TO_EXCLUDE=["auth"]
+        )
+        self.assertIn(Book, tracked_models)
+        self.assertNotIn(Group, tracked_models)
+
+    @mock.patch.multiple(Collector, start=mock.DEFAULT, stop=mock.DEFAULT)
+    def test_lazy_instrumentation(self, **mocks):
+        TastyRestaurantFactory()
+        tracker.uninstall()
+        try:
+            with mock.patch.object(tracker, "LAZY_INSTRUMENTATION", True):
+                tracker.start()
+                self.assertNotIn("from_db", vars(Book))
+                self.assertNotIn("from_db", vars(TastyRestaurant))
+
+                restaurants = TastyRestaurant.objects.all()
+                self.assertEqual(len(restaurants), 1)
+                self.assertEqual(get_queryset_tracker(restaurants).num_instances, 1)
+                self.assertIn(
+                    "name", get_instance_tracker(restaurants[0]).counters.field_names
+                )
+
+                # Parents are instrumented along with their children.
+                self.assertIn("from_db", vars(TastyRestaurant))
+                self.assertIn("from_db", vars(Place))
+                self.assertNotIn("from_db", vars(Book))
+        finally:
+            tracker.uninstall()
+            tracker.start()
+        self.assertIn("from_db", vars(Book))
+
+    @mock.patch.multiple(Collector, start=mock.DEFAULT, stop=mock.DEFAULT)
+    def test_untracked_subclasses(self, **mocks):
+        TastyRestaurantFactory()
+        tracker.uninstall()
+        try:
+            for lazy in (False, True):
+                with self.subTest(lazy=lazy), mock.patch.object(
+                    tracker, "TRACKED_MODELS", {Place}
+                ), mock.patch.object(tracker, "LAZY_INSTRUMENTATION", lazy):
+                    tracker.start()
+                    places = list(Place.objects.all())
+                    self.assertEqual(len(places), 1)
+                    self.assertIs(places[0].__class__, Place)
+                    self.assertTrue(hasattr(places[0], "_tracker"))
+
+                    # Untracked proxies and multi-table children of a tracked model
+                    # are loaded as themselves and aren't tracked.
+                    for model in (Venue, TastyRestaurant):
+                        (obj,) = model.objects.all()
+                        self.assertIs(obj.__class__, model)
+                        self.assertFalse(hasattr(obj, "_tracker"))
+                    tracker.uninstall()
+        finally:
+            tracker.start()
+
+
+@unittest.skipIf(DJANGO_VERSION < (4, 1), "Async queries require Django 4.1+")
+class TestAsync(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        BookFactory.create_batch(3)
+
+    @mock.patch.object(DummyRequestTracker, "add_tracker")
+    async def test_async_queries(self, add_tracker):
+        books = [book async for book in Book.objects.all()]
+        self.assertEqual(len(books), 3)
+        self.assertTrue(hasattr(books[0], "_tracker"))
+        self.assertIs(await Book.objects.aexists(), True)
+        self.assertEqual(await Book.objects.acount(), 3)
+        self.assertIsNotNone(await Book.objects.afirst())
+        self.assertEqual(len([book async for book in Book.objects.aiterator()]), 3)
+
+        trackers = [call.args[0] for call in add_tracker.call_args_list]
+        self.assertEqual(
+            [qs_tracker.query_type for qs_tracker in trackers],
+            [
+                QueryType.SELECT,
+                QueryType.EXISTS,
+                QueryType.COUNT,
+                QueryType.SELECT,
+                QueryType.SELECT,
+            ],
+        )
+        for qs_tracker in trackers:
+            # Tracebacks point to the caller, not to the `sync_to_async` thread.
+            stack, _ = qs_tracker.traceback
+            self.assertIn("test_async_queries", [entry.func for entry in stack])
+
+    @mock.patch.object(DummyRequestTracker, "add_tracker")
+    async def test_async_iteration_duration(self, add_tracker):
+        sleep = 0.05
+        async for _ in Book.objects.aiterator(chunk_size=1):
+            await asyncio.sleep(sleep)
+
+        (qs_tracker,) = [call.args[0] for call in add_tracker.call_args_list]
+        self.assertEqual(qs_tracker.num_instances, 3)
+        # Time spent by the consumer between chunks isn't counted.
+        self.assertLess(qs_tracker.duration, sleep * 1e9)
+
+    async def test_aiterator_ready(self):
+        with mock.patch.object(DummyRequestTracker, "add_tracker") as add_tracker:
+            books = [book async for book in Book.objects.aiterator()]
+
+        (qs_tracker,) = [call.args[0] for call in add_tracker.call_args_list]
+        self.assertTrue(qs_tracker._iter_done)
+        self.assertFalse(qs_tracker.ready)
+        del books
+        # The last chunk is released once the event loop runs the callbacks
+        # of the `sync_to_async` thread.
+        for _ in range(100):
+            if qs_tracker.ready:
+                break
+            await asyncio.sleep(0.01)
+        self.assertTrue(qs_tracker.ready)
+
+    @unittest.skipIf(DJANGO_VERSION < (5, 0), "Signal.asend requires Django 5.0+")
+    async def test_request_finished_asend(self):
+        request = AsyncRequestFactory().get(reverse("books"))
+        self.assertIs(get_request(), request)
+        request_tracker = request._tracker
+
+        await signals.request_finished.asend(sender=None)
+        self.assertTrue(request_tracker.finished)
+        self.assertIs(get_request(), DUMMY_REQUEST)
+
+
+class TestThreads(TestCase):
+    def setUp(self):
+        self.request = RequestFactory().get(reverse("books"))
+        self.addCleanup(tracker.set_request, DUMMY_REQUEST)
+
+    def test_with_context(self):
+        with ThreadPoolExecutor(max_workers=2) as executor:
+            self.assertIs(executor.submit(get_request).result(), DUMMY_REQUEST)
+            self.assertEqual(
+                list(executor.map(with_context(get_request), range(4))),
+                [self.request] * 4,
+            )
+
+    def test_context_executor(self):
+        with ContextThreadPoolExecutor(max_workers=2) as executor:
+            self.assertIs(executor.submit(get_request).result(), self.request)
+
+    @mock.patch.multiple(Collector, start=mock.DEFAULT, stop=mock.DEFAULT)
+    def test_patch_thread_pool_executor(self, **mocks):
+        tracker.uninstall()
+        try:
+            with mock.patch.object(tracker, "PATCH_THREAD_POOL_EXECUTOR", True):
+                tracker.start()
+                with ThreadPoolExecutor(max_workers=2) as executor:
+                    self.assertIs(executor.submit(get_request).result(), self.request)
+        finally:
+            tracker.uninstall()
+            tracker.start()
+
+        with ThreadPoolExecutor(max_workers=2) as executor:
+            self.assertIs(executor.submit(get_request).result(), DUMMY_REQUEST)
+
+    def test_concurrent_tracker_creation(self):
+        request = RequestFactory().get(reverse("books"))
+        create_tracker = tracker.RequestTracker
+
+        def slow_create_tracker(request):
+            time.sleep(0.01)
+            return create_tracker(request)
+
+        with mock.patch.object(
+            tracker, "RequestTracker", side_effect=slow_create_tracker
+        ) as RequestTracker, ThreadPoolExecutor(max_workers=4) as executor:
+            trackers = list(executor.map(lambda _: request._tracker, range(4)))
+
+        self.assertEqual(RequestTracker.call_count, 1)
+        self.assertEqual(len(set(trackers)), 1)
+        self.assertIs(trackers[0], request._tracker)
+
+    def test_concurrent_counts(self):
+        request_tracker = self.request._tracker
+        num_threads, num_queries = 8, 1000
+
+        def run_queries():
+            for _ in range(num_queries):
+                request_tracker.query_started()
+                request_tracker.count_execution(1)
+
+        threads = [
+            threading.Thread(target=with_context(run_queries))
+            for _ in range(num_threads)
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(request_tracker.num_queries, num_threads * num_queries)
+        self.assertEqual(request_tracker.num_counted_queries, num_threads * num_queries)